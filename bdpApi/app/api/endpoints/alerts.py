@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+
+from app.core.auth import get_current_active_user
+from app.models.database_models import UserModel
+from app.services.alert_dispatcher import alert_dispatcher
+
+router = APIRouter()
+
+@router.get("/status", response_model=dict)
+async def get_alert_status(current_user: UserModel = Depends(get_current_active_user)):
+    """Trạng thái gửi cảnh báo tới ESP32 (circuit breaker, hàng đợi, số lệnh đã gửi/lỗi)"""
+    return alert_dispatcher.status()
@@ -7,7 +7,7 @@ from pydantic import BaseModel
 
 from app.core.auth import (
     authenticate_user, create_access_token, 
-    get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES,
+    password_hasher, ACCESS_TOKEN_EXPIRE_MINUTES,
     get_current_active_user, get_user_by_id
 )
 from app.models.database_models import (
@@ -100,7 +100,7 @@ async def register_user(user_data: UserCreateModel):
         )
     
     # Tạo người dùng mới
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user_model = UserModel(
         username=user_data.username,
         email=user_data.email,
@@ -129,4 +129,9 @@ async def get_user_profile(current_user: UserModel = Depends(get_current_active_
         username=current_user.username,
         email=current_user.email,
         is_active=current_user.is_active
-    ) 
\ No newline at end of file
+    ) 
+
+@router.get("/hash-stats", response_model=dict)
+async def get_password_hash_stats(current_user: UserModel = Depends(get_current_active_user)):
+    """Thống kê thread pool băm mật khẩu (thời gian chờ trong hàng đợi, tính bằng giây)"""
+    return password_hasher.stats()
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends
 from app.models.schemas import CameraRequest, ApiResponse
 from app.core.camera import CameraState
+import asyncio
 import threading
 import queue
 
@@ -36,7 +37,8 @@ def process_camera():
 
 @router.post("/start_camera", response_model=ApiResponse)
 async def start_camera(request: CameraRequest, camera_state=Depends(get_camera_state)):
-    success = camera_state.start(request.camera_id)
+    # Mở camera và nạp model có thể mất vài giây: không chặn event loop
+    success = await asyncio.to_thread(camera_state.start, request.camera_id)
     if success:
         # Khởi động luồng xử lý camera
         threading.Thread(target=process_camera, daemon=True).start()
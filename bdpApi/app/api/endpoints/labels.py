@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
 from bson import ObjectId
 from typing import List, Optional, Dict, Any
 from datetime import datetime
@@ -8,6 +8,7 @@ from app.models.database_models import (
 )
 from app.database.database import get_labels_collection
 from app.core.auth import get_current_active_user
+from app.services.label_cache import label_cache
 
 router = APIRouter()
 
@@ -31,6 +32,7 @@ async def create_label(
     
     # Lưu nhãn mới
     result = await labels_collection.insert_one(label.dict(by_alias=True))
+    label_cache.invalidate()
     
     return LabelResponseModel(
         _id=str(result.inserted_id),
@@ -43,17 +45,20 @@ async def create_label(
 
 @router.get("/", response_model=List[LabelResponseModel])
 async def get_labels(
+    request: Request,
+    response: Response,
     current_user: Optional[UserModel] = Depends(get_current_active_user),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000)
 ):
-    """Lấy danh sách nhãn tư thế"""
-    labels_collection = await get_labels_collection()
-    
-    cursor = labels_collection.find().skip(skip).limit(limit)
+    """Lấy danh sách nhãn tư thế (từ cache, hỗ trợ ETag/If-None-Match)"""
+    etag = f'"{await label_cache.get_etag()}-{skip}-{limit}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     
     labels = []
-    async for label in cursor:
+    for label in (await label_cache.list())[skip:skip + limit]:
         labels.append(LabelResponseModel(
             _id=str(label["_id"]),
             label_id=label["label_id"],
@@ -71,10 +76,8 @@ async def get_label(
     current_user: Optional[UserModel] = Depends(get_current_active_user)
 ):
     """Lấy thông tin chi tiết một nhãn tư thế"""
-    labels_collection = await get_labels_collection()
-    
     # Tìm theo label_id (không phải _id)
-    label = await labels_collection.find_one({"label_id": label_id})
+    label = await label_cache.get(label_id)
     
     if not label:
         raise HTTPException(status_code=404, detail="Không tìm thấy nhãn tư thế")
@@ -121,6 +124,7 @@ async def update_label(
         {"_id": existing_label["_id"]},
         {"$set": update_data}
     )
+    label_cache.invalidate()
     
     # Trả về thông tin đã cập nhật
     updated_label = await labels_collection.find_one({"_id": existing_label["_id"]})
@@ -150,5 +154,6 @@ async def delete_label(
     
     # Xóa nhãn
     await labels_collection.delete_one({"_id": existing_label["_id"]})
+    label_cache.invalidate()
     
     return {"message": "Đã xóa nhãn tư thế thành công"} 
\ No newline at end of file
@@ -1,20 +1,102 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+import base64
+import json
 
 from app.models.database_models import (
     SessionModel, SessionResponseModel, 
     SessionItemModel, SessionItemResponseModel,
-    SessionDetailModel, UserModel
+    SessionDetailModel, SessionItemsPageModel, SessionSummaryModel,
+    SessionBulkDeleteModel, SessionDeleteJobModel, PostureSampleModel, UserModel
 )
+from app.config import POSTURE_SAMPLES_ENABLED
+from app.database.aggregations import session_summary_pipeline, posture_samples_pipeline, build_label_stats, to_local_naive
 from app.database.database import (
-    get_sessions_collection, get_session_items_collection
+    get_sessions_collection, get_session_items_collection, get_posture_samples_collection
 )
 from app.core.auth import get_current_active_user
+from app.services.image_store import image_ref_to_url
+from app.services.session_cleanup import session_cleanup
 
 router = APIRouter()
 
+# Các trường của session item có thể chọn qua ?fields=
+SESSION_ITEM_FIELDS = {
+    "session_id", "timestamp", "accuracy", "image", "image_path", "image_ref", "image_url",
+    "start_timestamp", "end_timestamp", "label_name", "label_id", "label_recommendation"
+}
+# Thứ tự ổn định dùng cho phân trang theo cursor
+SESSION_ITEM_SORT = [("start_timestamp", 1), ("_id", 1)]
+
+def _encode_cursor(item: Dict[str, Any]) -> str:
+    """Cursor trỏ tới sau item cuối cùng của trang (start_timestamp, _id)"""
+    raw = f"{item['start_timestamp'].isoformat()}|{item['_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _items_query(session_id: ObjectId, after: Optional[str]) -> Dict[str, Any]:
+    """Điều kiện lọc session item của một phiên, bắt đầu sau cursor nếu có"""
+    query: Dict[str, Any] = {"session_id": session_id}
+    if after:
+        try:
+            raw = base64.urlsafe_b64decode(after.encode("ascii")).decode("utf-8")
+            start_timestamp, item_id = raw.split("|")
+            start_timestamp = datetime.fromisoformat(start_timestamp)
+            item_id = ObjectId(item_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+        query["$or"] = [
+            {"start_timestamp": {"$gt": start_timestamp}},
+            {"start_timestamp": start_timestamp, "_id": {"$gt": item_id}}
+        ]
+    return query
+
+def _items_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Chuyển ?fields=a,b,c thành projection MongoDB (None = tất cả các trường)"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - SESSION_ITEM_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Trường không hợp lệ: {', '.join(sorted(unknown))}")
+    if "image_url" in requested:
+        requested.discard("image_url")
+        requested.add("image_ref")
+    projection = {field: 1 for field in requested}
+    # Cần start_timestamp để tạo cursor
+    projection["start_timestamp"] = 1
+    return projection
+
+def _serialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Chuyển document session item (có thể đã projection) thành dict JSON"""
+    result = {}
+    for key, value in item.items():
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        result[key] = value
+    if "image_ref" in item:
+        result["image_url"] = image_ref_to_url(item["image_ref"])
+    return result
+
+async def _get_user_session(session_id: str, current_user: UserModel) -> Dict[str, Any]:
+    """Lấy phiên của người dùng hiện tại hoặc báo lỗi 400/404"""
+    if not ObjectId.is_valid(session_id):
+        raise HTTPException(status_code=400, detail="ID phiên không hợp lệ")
+    
+    sessions_collection = await get_sessions_collection()
+    session = await sessions_collection.find_one({
+        "_id": ObjectId(session_id),
+        "user_id": ObjectId(current_user.id)
+    })
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="Không tìm thấy phiên ghi nhận")
+    return session
+
 @router.post("/", response_model=SessionResponseModel)
 async def create_session(current_user: UserModel = Depends(get_current_active_user)):
     """Tạo một phiên ghi nhận tư thế mới"""
@@ -79,28 +161,29 @@ async def get_latest_session(current_user: UserModel = Depends(get_current_activ
 @router.get("/{session_id}", response_model=SessionDetailModel)
 async def get_session_detail(
     session_id: str = Path(...),
-    current_user: UserModel = Depends(get_current_active_user)
+    current_user: UserModel = Depends(get_current_active_user),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = Query(None)
 ):
-    """Lấy chi tiết của một phiên ghi nhận"""
-    if not ObjectId.is_valid(session_id):
-        raise HTTPException(status_code=400, detail="ID phiên không hợp lệ")
+    """Lấy chi tiết của một phiên ghi nhận.
     
-    sessions_collection = await get_sessions_collection()
+    Mặc định trả về tất cả các mục; truyền `limit` để phân trang, trang tiếp theo
+    lấy bằng `after=<next_cursor>`.
+    """
+    session = await _get_user_session(session_id, current_user)
     session_items_collection = await get_session_items_collection()
     
-    session = await sessions_collection.find_one({
-        "_id": ObjectId(session_id),
-        "user_id": ObjectId(current_user.id)
-    })
-    
-    if not session:
-        raise HTTPException(status_code=404, detail="Không tìm thấy phiên ghi nhận")
-    
     # Lấy các mục trong phiên
-    items_cursor = session_items_collection.find({"session_id": ObjectId(session_id)})
+    items_cursor = session_items_collection.find(
+        _items_query(session["_id"], after)
+    ).sort(SESSION_ITEM_SORT)
+    if limit:
+        items_cursor = items_cursor.limit(limit)
     
     session_items = []
+    last_item = None
     async for item in items_cursor:
+        last_item = item
         session_items.append(SessionItemResponseModel(
             _id=str(item["_id"]),
             session_id=str(item["session_id"]),
@@ -108,6 +191,8 @@ async def get_session_detail(
             accuracy=item["accuracy"],
             image=item.get("image"),
             image_path=item.get("image_path"),
+            image_ref=item.get("image_ref"),
+            image_url=image_ref_to_url(item.get("image_ref")),
             start_timestamp=item["start_timestamp"],
             end_timestamp=item.get("end_timestamp"),
             label_name=item["label_name"],
@@ -119,11 +204,138 @@ async def get_session_detail(
         _id=str(session["_id"]),
         user_id=str(session["user_id"]),
         creation_date=session["creation_date"],
-        items=session_items
+        items=session_items,
+        next_cursor=_encode_cursor(last_item) if limit and len(session_items) == limit else None
+    )
+
+@router.get("/{session_id}/items", response_model=SessionItemsPageModel)
+async def get_session_items(
+    session_id: str = Path(...),
+    current_user: UserModel = Depends(get_current_active_user),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Ví dụ: label_id,start_timestamp,end_timestamp")
+):
+    """Lấy một trang session item theo cursor, có thể chọn trường trả về"""
+    session = await _get_user_session(session_id, current_user)
+    session_items_collection = await get_session_items_collection()
+    
+    items_cursor = session_items_collection.find(
+        _items_query(session["_id"], after),
+        projection=_items_projection(fields)
+    ).sort(SESSION_ITEM_SORT).limit(limit)
+    
+    items = []
+    last_item = None
+    async for item in items_cursor:
+        last_item = item
+        items.append(_serialize_item(item))
+    
+    return SessionItemsPageModel(
+        items=items,
+        next_cursor=_encode_cursor(last_item) if len(items) == limit else None
+    )
+
+@router.get("/{session_id}/summary", response_model=SessionSummaryModel)
+async def get_session_summary(
+    session_id: str = Path(...),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """Thống kê thời lượng theo từng tư thế của một phiên (tính bằng aggregation trên MongoDB)"""
+    session = await _get_user_session(session_id, current_user)
+    session_items_collection = await get_session_items_collection()
+    
+    groups = []
+    async for group in session_items_collection.aggregate(session_summary_pipeline(session["_id"])):
+        groups.append({"label_id": group["_id"], "count": group["count"], "duration_ms": group["duration_ms"]})
+    
+    labels = build_label_stats(groups)
+    return SessionSummaryModel(
+        session_id=str(session["_id"]),
+        item_count=sum(label["count"] for label in labels),
+        total_duration_seconds=sum(label["duration_seconds"] for label in labels),
+        labels=labels
+    )
+
+@router.get("/{session_id}/samples", response_model=List[PostureSampleModel])
+async def get_session_samples(
+    session_id: str = Path(...),
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    resolution: Optional[int] = Query(None, ge=1, le=3600, description="Gộp mẫu theo số giây"),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """Lịch sử tư thế chi tiết (từng giây) của một phiên từ time-series collection"""
+    if not POSTURE_SAMPLES_ENABLED:
+        raise HTTPException(status_code=404, detail="Chưa bật lưu mẫu tư thế")
+    session = await _get_user_session(session_id, current_user)
+    posture_samples_collection = await get_posture_samples_collection()
+    
+    pipeline = posture_samples_pipeline(
+        session["_id"], to_local_naive(from_date), to_local_naive(to_date), resolution
     )
+    return await posture_samples_collection.aggregate(pipeline).to_list(None)
+
+@router.get("/{session_id}/items/stream")
+async def stream_session_items(
+    session_id: str = Path(...),
+    current_user: UserModel = Depends(get_current_active_user),
+    after: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None)
+):
+    """Trả về session item dạng NDJSON, mỗi dòng một item, theo thứ tự cursor MongoDB trả về"""
+    session = await _get_user_session(session_id, current_user)
+    session_items_collection = await get_session_items_collection()
+    
+    items_cursor = session_items_collection.find(
+        _items_query(session["_id"], after),
+        projection=_items_projection(fields),
+        batch_size=200
+    ).sort(SESSION_ITEM_SORT)
+    
+    async def generate():
+        async for item in items_cursor:
+            yield json.dumps(_serialize_item(item), ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 
 
 
+@router.post("/bulk-delete", response_model=SessionDeleteJobModel, status_code=202)
+async def bulk_delete_sessions(
+    request: SessionBulkDeleteModel,
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """Xóa hàng loạt phiên ghi nhận (kèm các mục và ảnh) ở chế độ nền.
+    
+    Trả về job để theo dõi tiến độ qua GET /sessions/bulk-delete/{job_id}.
+    """
+    query: Dict[str, Any] = {"user_id": ObjectId(current_user.id)}
+    if request.older_than_days is not None:
+        query["creation_date"] = {"$lt": datetime.now() - timedelta(days=request.older_than_days)}
+        description = f"sessions older than {request.older_than_days} days"
+    elif request.session_ids:
+        if not all(ObjectId.is_valid(session_id) for session_id in request.session_ids):
+            raise HTTPException(status_code=400, detail="ID phiên không hợp lệ")
+        query["_id"] = {"$in": [ObjectId(session_id) for session_id in request.session_ids]}
+        description = f"{len(request.session_ids)} selected sessions"
+    else:
+        raise HTTPException(status_code=400, detail="Cần older_than_days hoặc session_ids")
+    
+    job = session_cleanup.start_delete(query, str(current_user.id), description)
+    return job.to_dict()
+
+@router.get("/bulk-delete/{job_id}", response_model=SessionDeleteJobModel)
+async def get_bulk_delete_job(
+    job_id: str = Path(...),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """Tiến độ của một lần xóa hàng loạt"""
+    job = session_cleanup.get_job(job_id)
+    if not job or job.user_id != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Không tìm thấy tác vụ xóa")
+    return job.to_dict()
 
 @router.delete("/{session_id}", response_model=dict)
 async def delete_session(
@@ -135,7 +347,6 @@ async def delete_session(
         raise HTTPException(status_code=400, detail="ID phiên không hợp lệ")
     
     sessions_collection = await get_sessions_collection()
-    session_items_collection = await get_session_items_collection()
     
     session = await sessions_collection.find_one({
         "_id": ObjectId(session_id),
@@ -145,10 +356,9 @@ async def delete_session(
     if not session:
         raise HTTPException(status_code=404, detail="Không tìm thấy phiên ghi nhận")
     
-    # Xóa tất cả các mục trong phiên
-    await session_items_collection.delete_many({"session_id": ObjectId(session_id)})
-    
-    # Xóa phiên
-    await sessions_collection.delete_one({"_id": ObjectId(session_id)})
+    # Xóa phiên cùng các mục và ảnh không còn được tham chiếu
+    job = await session_cleanup.delete_sessions({"_id": session["_id"], "user_id": session["user_id"]})
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Lỗi khi xóa phiên ghi nhận: {job.error}")
     
-    return {"message": "Đã xóa phiên ghi nhận thành công"} 
\ No newline at end of file
+    return {"message": "Đã xóa phiên ghi nhận thành công"}
\ No newline at end of file
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from bson import ObjectId
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+
+from app.models.database_models import UserModel, UserStatsModel
+from app.database.database import get_sessions_collection
+from app.database.aggregations import user_stats_pipeline, build_label_stats, to_local_naive
+from app.core.auth import get_current_active_user
+
+router = APIRouter()
+
+@router.get("/me/stats", response_model=UserStatsModel)
+async def get_my_stats(
+    current_user: UserModel = Depends(get_current_active_user),
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    bucket: str = Query("day", pattern="^(day|week)$")
+):
+    """Thống kê thời lượng từng tư thế của người dùng hiện tại theo ngày hoặc tuần.
+    
+    Mặc định lấy 7 ngày gần nhất. Khoảng thời gian là [from, to).
+    """
+    # Client JS gửi giờ UTC có múi giờ (toISOString()); timestamp lưu là giờ địa phương
+    to_date = to_local_naive(to_date) or datetime.now()
+    from_date = to_local_naive(from_date) or (to_date - timedelta(days=7))
+    if from_date >= to_date:
+        raise HTTPException(status_code=400, detail="Khoảng thời gian không hợp lệ")
+    
+    sessions_collection = await get_sessions_collection()
+    pipeline = user_stats_pipeline(ObjectId(current_user.id), from_date, to_date, bucket)
+    
+    # Gom kết quả theo bucket, giữ thứ tự thời gian
+    buckets: Dict[str, List[dict]] = {}
+    totals: Dict[str, dict] = {}
+    async for group in sessions_collection.aggregate(pipeline):
+        label_id = group["_id"]["label_id"]
+        buckets.setdefault(group["_id"]["bucket"], []).append({
+            "label_id": label_id,
+            "count": group["count"],
+            "duration_ms": group["duration_ms"]
+        })
+        total = totals.setdefault(label_id, {"label_id": label_id, "count": 0, "duration_ms": 0})
+        total["count"] += group["count"]
+        total["duration_ms"] += group["duration_ms"]
+    
+    bucket_stats = []
+    for bucket_key, groups in buckets.items():
+        labels = build_label_stats(groups)
+        bucket_stats.append({
+            "bucket": bucket_key,
+            "total_duration_seconds": sum(label["duration_seconds"] for label in labels),
+            "labels": labels
+        })
+    
+    labels = build_label_stats(totals.values())
+    return UserStatsModel(
+        user_id=str(current_user.id),
+        from_date=from_date,
+        to_date=to_date,
+        bucket=bucket,
+        total_duration_seconds=sum(label["duration_seconds"] for label in labels),
+        labels=labels,
+        buckets=bucket_stats
+    )
@@ -1,25 +1,29 @@
 import json
 import asyncio
-import base64
-import os
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, Query
 from typing import List, Dict, Any, Optional
 from app.api.endpoints.camera import message_queue, get_camera_state, process_camera
-from app.config import logger, SCREENSHOTS_DIR
+from app.config import logger, IMAGE_STORAGE_MODE, POSTURE_SAMPLES_ENABLED
+from app.core.ws_outbox import ClientOutbox
+from app.core.frame_codec import TRANSPORTS, TRANSPORT_BINARY, TRANSPORT_JSON, encode_frame_message, to_data_url
 from queue import Empty
 from bson import ObjectId
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
 
 from app.models.schemas import WebSocketMessage, WebSocketCommand
 from app.services.model_service import PostureDetectionService
+from app.services.session_writer import SessionItemWriter, PostureSampleWriter
+from app.services.label_cache import label_cache
+from app.services.alert_service import alert_service
+from app.services.image_store import store_image, image_ref_to_path, image_ref_to_url
 from app.models.database_models import (
-    SessionModel, SessionItemModel, LabelModel
+    SessionModel, SessionItemModel, LabelModel, UserModel
 )
 from app.database.database import (
-    get_sessions_collection, get_session_items_collection, get_labels_collection, get_users_collection
+    get_sessions_collection, get_session_items_collection,
+    get_posture_samples_collection
 )
-from app.core.auth import get_current_user, SECRET_KEY, ALGORITHM
+from app.core.auth import get_current_user, get_current_active_user, get_user_from_token
 
 router = APIRouter()
 
@@ -27,22 +31,30 @@ router = APIRouter()
 class WebSocketManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        self.outboxes: Dict[str, ClientOutbox] = {}
         self.detection_services: Dict[str, PostureDetectionService] = {}
         self.detection_tasks: Dict[str, asyncio.Task] = {}
         self.session_ids: Dict[str, ObjectId] = {}
         self.last_posture_check: Dict[str, datetime] = {}
         self.last_posture_label: Dict[str, str] = {}
+        self.transports: Dict[str, str] = {}
+        self.client_users: Dict[str, str] = {}  # client_id -> user_id đã xác thực
     
     async def connect(self, websocket: WebSocket, client_id: str):
         """Kết nối client mới"""
         await websocket.accept()
         self.active_connections[client_id] = websocket
+        self.outboxes[client_id] = ClientOutbox(websocket, client_id)
         logger.info(f"WebSocket client connected: {client_id}")
     
     def disconnect(self, client_id: str):
         """Ngắt kết nối client"""
         if client_id in self.active_connections:
             del self.active_connections[client_id]
+        if client_id in self.outboxes:
+            outbox = self.outboxes.pop(client_id)
+            outbox.close()
+            logger.info(f"WebSocket client {client_id} send stats: {outbox.stats()}")
         if client_id in self.detection_services:
             self.detection_services[client_id].stop()
             del self.detection_services[client_id]
@@ -53,21 +65,43 @@ class WebSocketManager:
             del self.last_posture_check[client_id]
         if client_id in self.last_posture_label:
             del self.last_posture_label[client_id]
+        self.transports.pop(client_id, None)
+        self.client_users.pop(client_id, None)
         logger.info(f"WebSocket client disconnected: {client_id}")
     
-    async def send_message(self, client_id: str, message: dict):
-        """Gửi tin nhắn tới client"""
-        if client_id in self.active_connections:
-            await self.active_connections[client_id].send_json(message)
+    async def send_message(self, client_id: str, message: dict, data: Optional[bytes] = None):
+        """Đưa tin nhắn vào queue gửi của client (không chờ mạng).
+        
+        Nếu có `data`, tin nhắn nhị phân được gửi ngay sau tin nhắn JSON.
+        """
+        if client_id in self.outboxes:
+            self.outboxes[client_id].put(message, data)
     
     async def broadcast(self, message: dict):
         """Gửi tin nhắn tới tất cả client"""
-        for client_id in self.active_connections:
+        for client_id in list(self.outboxes):
             await self.send_message(client_id, message)
     
-    async def start_detection(self, client_id: str, camera_id: int, user_id: str, camera_url: Optional[str] = None):
+    def get_send_stats(self, user_id: str) -> Dict[str, Dict[str, int]]:
+        """Thống kê queue gửi của từng client thuộc một người dùng"""
+        return {
+            client_id: outbox.stats()
+            for client_id, outbox in list(self.outboxes.items())
+            if self.client_users.get(client_id) == user_id
+        }
+    
+    async def start_detection(self, client_id: str, camera_id: int, user_id: str, camera_url: Optional[str] = None,
+                              transport: str = TRANSPORT_JSON):
         """Bắt đầu phát hiện tư thế"""
         try:
+            if transport not in TRANSPORTS:
+                await self.send_message(client_id, {
+                    "type": "error",
+                    "message": f"Unknown transport: {transport}"
+                })
+                return
+            self.transports[client_id] = transport
+            
             # Tạo phiên mới trong MongoDB
             if user_id:
                 sessions_collection = await get_sessions_collection()
@@ -86,11 +120,12 @@ class WebSocketManager:
                 return
             
             # Khởi tạo dịch vụ phát hiện tư thế - hỗ trợ camera WiFi
+            # (lần đầu phải nạp model: chạy ngoài event loop để không chặn các stream khác)
             if camera_id == 1:
                 logger.info(f"Initializing WiFi camera with URL: {camera_url}")
-                service = PostureDetectionService(camera_id=camera_id, camera_url=camera_url)
+                service = await asyncio.to_thread(PostureDetectionService, camera_id=camera_id, camera_url=camera_url)
             else:
-                service = PostureDetectionService(camera_id=camera_id)
+                service = await asyncio.to_thread(PostureDetectionService, camera_id=camera_id)
             
             self.detection_services[client_id] = service
             
@@ -100,7 +135,7 @@ class WebSocketManager:
             
             # Tạo task bất đồng bộ
             self.detection_tasks[client_id] = asyncio.create_task(
-                self._detection_loop(client_id, service)
+                self._detection_loop(client_id, service, user_id)
             )
             
             camera_info = f"local camera {camera_id}" if camera_id != 1 else f"WiFi camera at {camera_url}"
@@ -134,10 +169,18 @@ class WebSocketManager:
         
         logger.info(f"Stopped posture detection for client {client_id}")
     
-    async def _detection_loop(self, client_id: str, service: PostureDetectionService):
+    async def _detection_loop(self, client_id: str, service: PostureDetectionService, user_id: Optional[str] = None):
         """Vòng lặp phát hiện tư thế"""
         session_items_collection = await get_session_items_collection() if client_id in self.session_ids else None
-        labels_collection = await get_labels_collection() if client_id in self.session_ids else None
+        
+        session_writer = SessionItemWriter(session_items_collection) if session_items_collection is not None else None
+        
+        # Mẫu tư thế theo từng giây (time-series collection), nếu được bật
+        sample_writer = None
+        if POSTURE_SAMPLES_ENABLED and client_id in self.session_ids and user_id:
+            sample_writer = PostureSampleWriter(
+                await get_posture_samples_collection(), self.session_ids[client_id], ObjectId(user_id)
+            )
         
         # Tracking variables
         last_label_id = None
@@ -145,7 +188,8 @@ class WebSocketManager:
         previous_session_item_id = None
         last_detection_time = datetime.now()
         current_posture_id = None
-        last_sent_image = None  # Biến để theo dõi ảnh cuối cùng được gửi
+        frame_seq = 0  # Số thứ tự frame nhị phân, để client ghép với metadata
+        binary_transport = self.transports.get(client_id) == TRANSPORT_BINARY
         
         try:
             while True:
@@ -155,6 +199,9 @@ class WebSocketManager:
                     current_time = datetime.now()
                     current_posture_id = frame_data.posture.posture
                     
+                    if sample_writer is not None:
+                        sample_writer.add_sample(current_time, current_posture_id, frame_data.posture.confidence)
+                    
                     # Chỉ xử lý thay đổi tư thế nếu đã qua 2 giây kể từ lần cuối kiểm tra
                     time_since_last_check = (current_time - last_detection_time).total_seconds()
                     
@@ -162,6 +209,8 @@ class WebSocketManager:
                     is_new_posture = False
                     should_save_image = False
                     image_path = None
+                    image_ref = None
+                    image_data_url = None  # Chỉ tạo base64 khi thực sự cần
                     
                     # Kiểm tra nếu thời gian trôi qua đủ 2 giây kể từ lần kiểm tra cuối
                     if time_since_last_check >= 2.0:
@@ -176,61 +225,48 @@ class WebSocketManager:
                             # Nếu tư thế vẫn giữ nguyên sau 2s, vẫn lưu ảnh mới
                             should_save_image = True
                     
-                    # Chỉ lưu ảnh nếu cần thiết (tư thế mới hoặc interval 2s)
-                    if should_save_image:
-                        # Lưu ảnh xuống thư mục
-                        timestamp = current_time.strftime("%Y%m%d_%H%M%S_%f")
-                        image_filename = f"{timestamp}_{current_posture_id}.jpg"
-                        image_path = os.path.join(SCREENSHOTS_DIR, image_filename)
-                        
-                        # Decode base64 image and save
+                    # Chỉ ảnh được session item mới tham chiếu mới lưu xuống đĩa (và được dọn khi xóa phiên);
+                    # ảnh chụp định kỳ 2s chỉ gửi cho client
+                    if should_save_image and is_new_posture and session_writer is not None:
+                        # Lưu ảnh xuống thư mục theo hash nội dung, ghi file trong thread riêng
                         try:
-                            image_data = base64.b64decode(frame_data.image.split(',')[1] if ',' in frame_data.image else frame_data.image)
-                            with open(image_path, "wb") as f:
-                                f.write(image_data)
-                            last_sent_image = frame_data.image  # Cập nhật ảnh đã gửi
+                            image_ref = await asyncio.to_thread(store_image, frame_data.jpeg)
+                            image_path = str(image_ref_to_path(image_ref))
                         except Exception as e:
                             logger.error(f"Error saving image: {str(e)}")
                     
                     # Gửi kết quả nhận dạng qua WebSocket
                     frame_data_dict = frame_data.dict()
                     
-                    # Chỉ thêm ảnh vào response nếu đã lưu ảnh mới
-                    if should_save_image and image_path:
-                        frame_data_dict["image_path"] = image_path
-                    else:
-                        # Nếu không có ảnh mới, bỏ trường image để giảm dữ liệu gửi
-                        frame_data_dict.pop("image", None)
+                    # Chỉ thêm ảnh vào response cho tư thế mới hoặc interval 2s
+                    frame_data_dict.pop("image", None)
+                    if should_save_image:
+                        if image_path:
+                            frame_data_dict["image_path"] = image_path
+                            frame_data_dict["image_url"] = image_ref_to_url(image_ref)
+                        if binary_transport:
+                            # Ảnh gửi riêng dưới dạng tin nhắn nhị phân
+                            frame_seq += 1
+                            frame_data_dict["frame_seq"] = frame_seq
+                        else:
+                            image_data_url = to_data_url(frame_data.jpeg)
+                            frame_data_dict["image"] = image_data_url
                     
                     # Lưu tư thế vào MongoDB nếu là tư thế mới
-                    if session_items_collection is not None and labels_collection is not None:
+                    if session_writer is not None:
                         if is_new_posture:
                             # Đầu tiên, đóng session item cũ nếu có
                             if previous_session_item_id is not None:
-                                await session_items_collection.update_one(
-                                    {"_id": previous_session_item_id},
-                                    {"$set": {"end_timestamp": current_time}}
-                                )
+                                session_writer.close_item(previous_session_item_id, current_time)
                                 
-                                # Lấy thông tin session item đã hoàn tất
-                                completed_item = await session_items_collection.find_one({"_id": previous_session_item_id})
-                                if completed_item:
-                                    duration = (completed_item["end_timestamp"] - completed_item["start_timestamp"]).total_seconds()
-                                    # Gửi thông tin session item hoàn tất cho client
-                                    await self.send_message(client_id, {
-                                        "type": "session_item_completed",
-                                        "data": {
-                                            "session_item_id": str(completed_item["_id"]),
-                                            "label_id": completed_item["label_id"],
-                                            "start_time": completed_item["start_timestamp"].isoformat(),
-                                            "end_time": completed_item["end_timestamp"].isoformat(),
-                                            "duration_seconds": duration
-                                        }
-                                    })
+                                # Gửi thông tin session item hoàn tất cho client (tính từ trạng thái cục bộ)
+                                await self.send_message(client_id, self._session_item_completed_message(
+                                    previous_session_item_id, last_label_id, current_start_time, current_time
+                                ))
                             
                             # Tạo session item mới cho tư thế mới
-                            # Lấy thông tin khuyến nghị từ labels collection
-                            label_info = await labels_collection.find_one({"label_id": current_posture_id})
+                            # Lấy thông tin khuyến nghị từ cache nhãn
+                            label_info = await label_cache.get(current_posture_id)
                             recommendation = None
                             if label_info:
                                 recommendation = label_info.get("recommendation")
@@ -248,15 +284,18 @@ class WebSocketManager:
                             }
                             
                             # Chỉ thêm ảnh và đường dẫn ảnh nếu đã lưu
-                            if should_save_image and image_path:
-                                session_item_dict["image"] = frame_data.image
+                            if image_path:
+                                session_item_dict["image_ref"] = image_ref
                                 session_item_dict["image_path"] = image_path
+                                if IMAGE_STORAGE_MODE == "embedded":
+                                    if image_data_url is None:
+                                        image_data_url = to_data_url(frame_data.jpeg)
+                                    session_item_dict["image"] = image_data_url
                             
                             session_item = SessionItemModel(**session_item_dict)
                             
-                            # Lưu vào database
-                            result = await session_items_collection.insert_one(session_item.dict(by_alias=True))
-                            previous_session_item_id = result.inserted_id
+                            # Đưa vào hàng đợi ghi, không chờ MongoDB
+                            previous_session_item_id = session_writer.open_item(session_item)
                             
                             # Cập nhật trạng thái
                             last_label_id = current_posture_id
@@ -282,33 +321,17 @@ class WebSocketManager:
                             
                             if previous_session_item_id:
                                 frame_data_dict["session_item_id"] = str(previous_session_item_id)
-                    if frame_data.posture.need_alert:
-                        try:
-                            # Tránh phát âm thanh quá thường xuyên
-                            current_time = datetime.now()
-                            last_alert_time = getattr(self, 'last_alert_time', None)
-                            alert_cooldown = 5.0  # 5 giây giữa các cảnh báo
-                            
-                            if last_alert_time is None or (current_time - last_alert_time).total_seconds() > alert_cooldown:
-                                logger.info(f"Phát hiện need_alert=true, đang phát âm thanh cho tư thế: {current_posture_id}")
-                                
-                                # Import và khởi tạo AlertService
-                                from app.services.alert_service import AlertService
-                                alert_service = AlertService()
-                                
-                                # Phát âm thanh
-                                alert_service.play_alert_sound(current_posture_id)
-                                
-                                # Cập nhật thời gian cảnh báo cuối cùng
-                                self.last_alert_time = current_time
-                        except Exception as e:
-                            logger.error(f"Lỗi khi phát âm thanh cảnh báo từ WebSocket: {str(e)}")
+                    # Âm thanh cảnh báo do stage cảnh báo của service phát (một lần cho mỗi đợt tư thế sai),
+                    # ở đây chỉ chuyển need_alert cho client
                     # Gửi kết quả cho client - chỉ nếu là tư thế mới hoặc interval
                     if is_new_posture or should_save_image:
+                        frame_message = None
+                        if "frame_seq" in frame_data_dict:
+                            frame_message = encode_frame_message(frame_data.jpeg, frame_seq)
                         await self.send_message(client_id, {
                             "type": "detection_result",
                             "data": frame_data_dict
-                        })
+                        }, frame_message)
                     else:
                         # Gửi thông tin nhẹ hơn (không có ảnh) cho client mỗi 0.5s
                         if time_since_last_check % 0.5 < 0.1:
@@ -321,34 +344,21 @@ class WebSocketManager:
                                 "type": "posture_update",
                                 "data": light_data
                             })
-                
-                # Ngủ một khoảng thời gian trước khi xử lý khung hình tiếp theo
-                await asyncio.sleep(0.1)
+                else:
+                    # Service đã dừng hoặc hết thời gian chờ, tránh vòng lặp bận
+                    await asyncio.sleep(0.1)
         
         except asyncio.CancelledError:
             # Cập nhật thời gian kết thúc của session item cuối cùng
-            if session_items_collection is not None and previous_session_item_id is not None:
+            if session_writer is not None and previous_session_item_id is not None:
                 try:
                     current_time = datetime.now()
-                    await session_items_collection.update_one(
-                        {"_id": previous_session_item_id},
-                        {"$set": {"end_timestamp": current_time}}
-                    )
+                    session_writer.close_item(previous_session_item_id, current_time)
                     
                     # Gửi thông báo về session item cuối cùng
-                    completed_item = await session_items_collection.find_one({"_id": previous_session_item_id})
-                    if completed_item:
-                        duration = (completed_item["end_timestamp"] - completed_item["start_timestamp"]).total_seconds()
-                        await self.send_message(client_id, {
-                            "type": "session_item_completed",
-                            "data": {
-                                "session_item_id": str(completed_item["_id"]),
-                                "label_id": completed_item["label_id"],
-                                "start_time": completed_item["start_timestamp"].isoformat(),
-                                "end_time": completed_item["end_timestamp"].isoformat(),
-                                "duration_seconds": duration
-                            }
-                        })
+                    await self.send_message(client_id, self._session_item_completed_message(
+                        previous_session_item_id, last_label_id, current_start_time, current_time
+                    ))
                 except Exception as e:
                     logger.error(f"Error updating final end timestamp: {str(e)}")
             
@@ -366,38 +376,50 @@ class WebSocketManager:
                 "message": f"Detection error: {str(e)}"
             })
             logger.error(f"Error in detection loop for client {client_id}: {str(e)}")
+        
+        finally:
+            # Luôn ghi nốt các session item còn trong hàng đợi
+            if session_writer is not None:
+                try:
+                    await session_writer.close()
+                except Exception as e:
+                    logger.error(f"Error flushing session items for client {client_id}: {str(e)}")
+            if sample_writer is not None:
+                try:
+                    await sample_writer.close()
+                except Exception as e:
+                    logger.error(f"Error flushing posture samples for client {client_id}: {str(e)}")
+    
+    @staticmethod
+    def _session_item_completed_message(item_id: ObjectId, label_id: str,
+                                        start_time: datetime, end_time: datetime) -> dict:
+        """Tạo tin nhắn session_item_completed từ dữ liệu đã có trong bộ nhớ"""
+        return {
+            "type": "session_item_completed",
+            "data": {
+                "session_item_id": str(item_id),
+                "label_id": label_id,
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+                "duration_seconds": (end_time - start_time).total_seconds()
+            }
+        }
 
 # Khởi tạo WebSocket manager
 ws_manager = WebSocketManager()
 
 # Xác thực token JWT từ query parameter
 async def verify_token(token: str = Query(...)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-            )
-        
-        # Lấy thông tin user từ database dựa vào username
-        users_collection = await get_users_collection()
-        user = await users_collection.find_one({"username": username})
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-            )
-        
-        # Trả về MongoDB ObjectId của user
-        return str(user["_id"])
-    except JWTError:
+    # Dùng chung cache token -> người dùng với các endpoint HTTP
+    user = await get_user_from_token(token)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
         )
+    
+    # Trả về MongoDB ObjectId của user
+    return str(user.id)
 
 # WebSocket endpoint
 async def handle_websocket(websocket: WebSocket, client_id: str, token: str):
@@ -406,6 +428,7 @@ async def handle_websocket(websocket: WebSocket, client_id: str, token: str):
     try:
         # Xác thực token
         user_id = await verify_token(token)
+        ws_manager.client_users[client_id] = user_id
         
         # Thông báo xác thực thành công
         await ws_manager.send_message(client_id, {
@@ -420,8 +443,6 @@ async def handle_websocket(websocket: WebSocket, client_id: str, token: str):
                 if isinstance(message, dict) and "check_alert" in message and message["check_alert"] == True:
                     logger.info("Nhận lệnh kiểm tra âm thanh cảnh báo")
                     # Phát âm thanh cảnh báo
-                    from app.services.alert_service import AlertService
-                    alert_service = AlertService()
                     alert_service.play_alert_sound("bad_sitting_forward")
                     await ws_manager.send_message(client_id, {
                         "type": "alert_status",
@@ -434,7 +455,8 @@ async def handle_websocket(websocket: WebSocket, client_id: str, token: str):
                     if command.action == "start":
                         # Sử dụng user_id đã xác thực và camera_url nếu có
                         camera_url = command.camera_url if hasattr(command, 'camera_url') else None
-                        await ws_manager.start_detection(client_id, command.camera_id, user_id, camera_url)
+                        await ws_manager.start_detection(client_id, command.camera_id, user_id, camera_url,
+                                                         command.transport or TRANSPORT_JSON)
                     
                     elif command.action == "stop":
                         await ws_manager.stop_detection(client_id)
@@ -442,8 +464,6 @@ async def handle_websocket(websocket: WebSocket, client_id: str, token: str):
                     elif command.action == "test_alert":
                         # Thêm lệnh test_alert
                         logger.info("Nhận lệnh test âm thanh cảnh báo")
-                        from app.services.alert_service import AlertService
-                        alert_service = AlertService()
                         alert_service.play_alert_sound("bad_sitting_forward")
                         await ws_manager.send_message(client_id, {
                             "type": "alert_status",
@@ -490,6 +510,11 @@ async def handle_websocket(websocket: WebSocket, client_id: str, token: str):
         await websocket.close()
         ws_manager.disconnect(client_id)
 
+@router.get("/ws/stats")
+async def websocket_send_stats(current_user: UserModel = Depends(get_current_active_user)):
+    """Thống kê queue gửi (số tin đã gửi, bị bỏ, bị gộp) của từng client WebSocket của người dùng hiện tại"""
+    return ws_manager.get_send_stats(str(current_user.id))
+
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket, 
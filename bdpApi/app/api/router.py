@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import camera, statistics, websocket, auth, sessions, labels
+from app.api.endpoints import camera, statistics, websocket, auth, sessions, labels, users, alerts
 
 router = APIRouter()
 
@@ -9,4 +9,6 @@ router.include_router(websocket.router, tags=["websocket"])
 router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 router.include_router(sessions.router, prefix="/sessions", tags=["sessions"])
 router.include_router(labels.router, prefix="/labels", tags=["labels"])
+router.include_router(users.router, prefix="/users", tags=["users"])
+router.include_router(alerts.router, prefix="/alerts", tags=["alerts"])
 
@@ -16,6 +16,31 @@ MODELS_DIR = DATA_DIR / "models"
 SCREENSHOTS_DIR = DATA_DIR / "screenshots"
 AUDIO_ALERTS_DIR = DATA_DIR / "audio_alerts"
 
+# Cách lưu ảnh của session item:
+# "reference" - MongoDB chỉ giữ tham chiếu (hash nội dung) tới file trong SCREENSHOTS_DIR
+# "embedded"  - giữ thêm ảnh base64 trong document như trước
+IMAGE_STORAGE_MODE = "reference"
+
+# Số phiên xóa trong mỗi lô khi xóa hàng loạt
+SESSION_DELETE_BATCH_SIZE = 50
+
+# Lưu thêm mẫu tư thế theo từng giây vào time-series collection (MongoDB >= 5.0)
+POSTURE_SAMPLES_ENABLED = False
+POSTURE_SAMPLES_COLLECTION = "posture_samples"
+POSTURE_SAMPLE_INTERVAL = 1.0  # giây giữa hai mẫu
+POSTURE_SAMPLE_RETENTION_DAYS = 30  # TTL của mẫu
+
+# Cache token -> người dùng cho các request đã xác thực
+AUTH_CACHE_TTL = 30.0  # giây
+AUTH_CACHE_SIZE = 1024
+
+# Băm/kiểm tra mật khẩu bcrypt trong thread pool riêng, không chặn event loop
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_MAX_PENDING = 32  # Quá số này thì từ chối với 503
+
+# Chạy explain() cho các truy vấn nóng khi khởi động, dừng ứng dụng nếu có COLLSCAN
+INDEX_VERIFY_ON_STARTUP = True
+
 # Tạo thư mục nếu chưa tồn tại
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(MODELS_DIR, exist_ok=True)
@@ -56,9 +81,46 @@ POSTURE_NAMES_VI = {
 # Cấu hình camera
 CAMERA_FRAME_INTERVAL = 0.1  # 10 FPS cho xử lý nội bộ
 IMAGE_SEND_INTERVAL = 2.0    # 2 giây gửi một ảnh
+STATS_SEND_INTERVAL = 5.0    # 5 giây gửi thống kê một lần
+WS_SEND_QUEUE_SIZE = 16      # Số tin nhắn tối đa chờ gửi cho mỗi client WebSocket
+
+# Cấu hình ghi session item theo lô (write-behind)
+SESSION_WRITE_FLUSH_INTERVAL = 2.0   # Chu kỳ ghi xuống MongoDB (giây)
+SESSION_WRITE_BATCH_SIZE = 20        # Ghi ngay khi số thao tác chờ đạt ngưỡng này
+SESSION_WRITE_MAX_RETRIES = 5        # Số lần thử lại một lô lỗi trước khi bỏ
+
+# Cấu hình suy luận theo batch
+INFERENCE_MAX_BATCH_SIZE = 32     # Số khung hình tối đa trong một lần predict
+INFERENCE_MAX_BATCH_WAIT = 0.01   # Thời gian chờ gom batch tối đa (giây)
+# Backend chạy model: "keras" (model.predict), "tf_function" (graph đã trace) hoặc "tflite"
+INFERENCE_BACKEND = "tf_function"
+# Giữ model trong bộ nhớ bao lâu sau khi tham chiếu cuối được trả (giây); None = không bao giờ giải phóng
+MODEL_IDLE_UNLOAD_AFTER = 600.0
+
+# Cấu hình pipeline capture -> inference -> encode
+PIPELINE_QUEUE_SIZE = 2       # Số frame tối đa chờ giữa hai stage (bỏ frame cũ nhất khi đầy)
+PIPELINE_POLL_TIMEOUT = 0.5   # Thời gian chờ queue để kiểm tra tín hiệu dừng (giây)
+
+# Cấu hình điều chỉnh tần suất phân tích tự động
+RATE_TARGET_LATENCY = 0.5     # Độ trễ mục tiêu từ lúc đổi tư thế tới lúc phát hiện (giây)
+RATE_MIN_INTERVAL = 0.066     # Khoảng cách tối thiểu giữa hai lần phân tích (~15 FPS)
+RATE_MAX_INTERVAL = 2.0       # Khoảng cách tối đa giữa hai lần phân tích (giây)
+RATE_STABLE_AFTER = 10.0      # Tư thế không đổi trong bao lâu thì coi là ổn định (giây)
+RATE_STABLE_INTERVAL = 1.0    # Khoảng cách phân tích khi tư thế ổn định (giây)
+RATE_CPU_BUDGET = 0.75        # Tỉ lệ tổng số core dành cho tất cả các luồng camera
 
 # Cấu hình cảnh báo
 BAD_POSTURE_THRESHOLD = 5    # Thời gian ngưỡng tính bằng giây
 ALERT_COOLDOWN = 10          # Thời gian chờ giữa các cảnh báo (giây)
+ALERT_CLEAR_AFTER = 2.0      # Tư thế đúng liên tục bao lâu thì kết thúc một đợt tư thế sai (giây)
+POSTURE_HISTORY_SIZE = 3600  # Số mẫu trong cửa sổ thống kê của PostureMonitor
 # Cấu hình ESP32 Audio Server
 ESP32_AUDIO_SERVER = "http://192.168.43.182"
+ESP32_PROBE_INTERVAL = 10.0   # Chu kỳ kiểm tra /status của ESP32 (giây)
+ESP32_PROBE_TIMEOUT = 1.0     # Timeout khi kiểm tra /status (giây)
+ESP32_REQUEST_TIMEOUT = 2.0   # Timeout khi gửi lệnh phát (giây)
+ALERT_QUEUE_SIZE = 8          # Số cảnh báo tối đa chờ gửi
+ALERT_DISPATCHER_START_TIMEOUT = 2.0  # Thời gian chờ thread gửi cảnh báo khởi động (giây)
+ESP32_FAILURE_THRESHOLD = 3   # Số lỗi liên tiếp trước khi ngắt mạch, phát cục bộ
+ESP32_BREAKER_RESET_TIMEOUT = 15.0       # Thời gian ngắt mạch ban đầu (giây)
+ESP32_BREAKER_MAX_RESET_TIMEOUT = 300.0  # Thời gian ngắt mạch tối đa (giây)
@@ -0,0 +1,75 @@
+import time
+from typing import Optional
+
+from app.config import BAD_POSTURE_THRESHOLD, ALERT_CLEAR_AFTER, ALERT_COOLDOWN
+
+def is_good_posture(posture: str) -> bool:
+    """Tư thế đúng: good_*, *right*, *correct* hoặc nhãn chung "posture" """
+    return (
+        posture.startswith("good_") or
+        "right" in posture or
+        "correct" in posture or
+        posture == "posture"
+    )
+
+class AlertPolicy:
+    """Alert decision for one detection session, O(1) state.
+
+    A bad-posture episode starts at the first bad prediction and only ends after
+    `clear_after` seconds of continuous good posture (hysteresis), so a single
+    good frame in the middle of slouching does not restart it. An alert fires
+    once the episode has lasted `onset` seconds (debounce) and then not again
+    for the same episode; `cooldown` additionally spaces alerts of consecutive
+    episodes. Every layer of a session (inference stage, camera loop, WebSocket
+    loop) must share one instance: update() returns True exactly once per
+    episode, and that caller is the one that dispatches.
+    """
+    __slots__ = ("onset", "clear_after", "cooldown", "bad_since", "good_since",
+                 "alerted", "last_alert_time", "alerts_fired")
+
+    def __init__(self, onset: float = BAD_POSTURE_THRESHOLD, clear_after: float = ALERT_CLEAR_AFTER,
+                 cooldown: float = ALERT_COOLDOWN):
+        self.onset = onset
+        self.clear_after = clear_after
+        self.cooldown = cooldown
+        self.alerts_fired = 0
+        self.reset()
+
+    def update(self, posture: str, now: Optional[float] = None) -> bool:
+        """Record one prediction; True if an alert must be dispatched now"""
+        now = time.monotonic() if now is None else now
+
+        if is_good_posture(posture):
+            if self.bad_since is not None:
+                if self.good_since is None:
+                    self.good_since = now
+                if now - self.good_since >= self.clear_after:
+                    # Kết thúc đợt tư thế sai
+                    self.bad_since = None
+                    self.good_since = None
+                    self.alerted = False
+            return False
+
+        self.good_since = None
+        if self.bad_since is None:
+            self.bad_since = now
+        if self.alerted or now - self.bad_since < self.onset:
+            return False
+        if self.last_alert_time is not None and now - self.last_alert_time < self.cooldown:
+            return False
+
+        self.alerted = True
+        self.last_alert_time = now
+        self.alerts_fired += 1
+        return True
+
+    @property
+    def alerting(self) -> bool:
+        """Đợt tư thế sai hiện tại đã được cảnh báo và chưa kết thúc"""
+        return self.alerted
+
+    def reset(self) -> None:
+        self.bad_since = None
+        self.good_since = None
+        self.alerted = False
+        self.last_alert_time = None
@@ -1,3 +1,6 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -6,8 +9,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
 
+from app.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
 from app.models.database_models import UserModel, UserInDBModel
 from app.database.database import get_users_collection
+from app.services.user_cache import token_user_cache
 
 # Cấu hình JWT
 SECRET_KEY = "posture_detection_super_secret_key_please_change_in_production"
@@ -28,6 +33,63 @@ def get_password_hash(password):
     """Tạo hash mật khẩu"""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt in a small dedicated thread pool instead of on the event loop.
+
+    bcrypt releases the GIL while hashing, so the detection streams keep running
+    during a burst of logins. At most `max_workers` hashes run at once; beyond
+    `max_pending` waiting calls new ones are rejected with 503. `stats()`
+    reports how long calls waited for a worker.
+    """
+    def __init__(self, max_workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Hệ thống đang bận, vui lòng thử lại sau",
+            )
+        queued_at = time.perf_counter()
+        
+        def timed_call():
+            queue_wait = time.perf_counter() - queued_at
+            return queue_wait, func(*args)
+        
+        self.pending += 1
+        try:
+            queue_wait, result = await asyncio.get_running_loop().run_in_executor(self._executor, timed_call)
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        self.total_queue_wait += queue_wait
+        self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+        return result
+
+    async def verify(self, plain_password, hashed_password) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password) -> str:
+        return await self._run(get_password_hash, password)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_wait": self.total_queue_wait / self.completed if self.completed else 0.0,
+            "max_queue_wait": self.max_queue_wait,
+        }
+
+password_hasher = PasswordHasher()
+
 async def get_user_by_username(username: str):
     """Lấy thông tin người dùng theo username"""
     users_collection = await get_users_collection()
@@ -57,7 +119,7 @@ async def authenticate_user(username: str, password: str):
     user = await get_user_by_username(username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return False
     return user
 
@@ -72,23 +134,32 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Lấy người dùng hiện tại từ token"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Không thể xác thực thông tin đăng nhập",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def get_user_from_token(token: str) -> Optional[UserInDBModel]:
+    """Giải mã token và lấy người dùng, dùng cache token -> người dùng nếu có"""
+    user = token_user_cache.get(token)
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        return None
+    username: str = payload.get("sub")
+    if username is None:
+        return None
     user = await get_user_by_username(username)
+    if user is not None:
+        token_user_cache.put(token, user, payload.get("exp"))
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """Lấy người dùng hiện tại từ token"""
+    user = await get_user_from_token(token)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Không thể xác thực thông tin đăng nhập",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 async def get_current_active_user(current_user: UserModel = Depends(get_current_user)):
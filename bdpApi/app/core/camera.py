@@ -10,9 +10,10 @@ import queue
 
 from app.core.utils import extract_features_from_landmarks
 from app.core.posture_monitor import PostureMonitor
-from app.services.model_service import ModelService
-from app.services.alert_service import AlertService
-from app.config import POSTURE_NAMES_VI, CAMERA_FRAME_INTERVAL, IMAGE_SEND_INTERVAL, logger
+from app.core.rate_controller import AdaptiveRateController
+from app.services.model_service import model_registry
+from app.services.alert_service import alert_service
+from app.config import POSTURE_NAMES_VI, CAMERA_FRAME_INTERVAL, IMAGE_SEND_INTERVAL, STATS_SEND_INTERVAL, logger
 
 mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
@@ -23,15 +24,17 @@ class CameraState:
         self.camera = None
         self.camera_id = 0
         self.pose = None
-        self.model_service = ModelService()
-        self.alert_service = AlertService()
+        self.model_service = None  # Lấy từ model_registry khi start()
+        self.inference_engine = None
+        self.alert_service = alert_service
         self.monitor = PostureMonitor()
         self.recent_predictions = []
         self.max_predictions = 10
-        self.last_frame_time = time.time()
-        self.frame_interval = CAMERA_FRAME_INTERVAL
+        self.rate_controller = AdaptiveRateController(min_interval=CAMERA_FRAME_INTERVAL)
         self.last_image_send_time = time.time()
         self.image_send_interval = IMAGE_SEND_INTERVAL
+        self.last_stats_send_time = time.time()
+        self.stats_send_interval = STATS_SEND_INTERVAL
         self.message_queue = message_queue
 
     def start(self, camera_id: int = 0) -> bool:
@@ -49,7 +52,12 @@ class CameraState:
                 min_detection_confidence=0.5,
                 min_tracking_confidence=0.5)
             
+            if self.model_service is None:
+                self.model_service = model_registry.acquire()
+                self.inference_engine = model_registry.get_inference_engine()
+            
             self.is_running = True
+            self.rate_controller.start()
             self.monitor.reset()
             self.recent_predictions = []
             logger.info(f"Đã khởi động camera với ID: {camera_id}")
@@ -65,10 +73,15 @@ class CameraState:
         
         try:
             self.is_running = False
+            self.rate_controller.stop()
             if self.camera:
                 self.camera.release()
             if self.pose:
                 self.pose.close()
+            if self.model_service is not None:
+                self.model_service = None
+                self.inference_engine = None
+                model_registry.release()
             
             logger.info("Đã dừng camera")
             return True
@@ -83,11 +96,9 @@ class CameraState:
             current_time = time.time()
             
             # Kiểm tra tần suất xử lý frame
-            if current_time - self.last_frame_time < self.frame_interval:
+            if not self.rate_controller.should_analyze():
                 return False
             
-            self.last_frame_time = current_time
-            
             # Đọc frame từ camera
             ret, frame = self.camera.read()
             if not ret:
@@ -118,7 +129,9 @@ class CameraState:
                     display_frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
                 
                 # Sử dụng phương pháp dự đoán mới (truyền trực tiếp kết quả MediaPipe)
-                predicted_class, confidence = self.model_service.predict_posture(results=results)
+                predicted_class, confidence = self.inference_engine.predict(results)
+                self.rate_controller.record_stage("inference", time.time() - current_time)
+                self.rate_controller.record_posture(predicted_class)
                 
                 if predicted_class:
                     # Thêm dự đoán vào danh sách gần đây
@@ -154,24 +167,18 @@ class CameraState:
                         # Hiển thị thông tin trên frame
                         
                         
-                        # Nếu cần cảnh báo
+                        # Nếu cần cảnh báo (monitor đã chống lặp: một lần cho mỗi đợt tư thế sai)
                         if need_alert:
                             try:
-                                # Kiểm tra thời gian từ cảnh báo cuối cùng
-                                current_time = time.time()
-                                if not hasattr(self, 'last_alert_time') or current_time - self.last_alert_time > 5.0:  # 5 giây cooldown
-                                    # Gửi tên tư thế trực tiếp đến hàm play_alert_sound
-                                    self.alert_service.play_alert_sound(smoothed_class)
-                                    
-                                    # Ghi log để debug
-                                    logger.info(f"Đã gửi cảnh báo âm thanh cho tư thế: {smoothed_class}")
-                                    
-                                    # Lưu ảnh chụp
-                                    screenshot_path = self.alert_service.save_screenshot(display_frame, smoothed_class)
-                                    logger.info(f"Đã lưu ảnh chụp tại: {screenshot_path}")
-                                    
-                                    # Cập nhật thời gian cảnh báo cuối cùng
-                                    self.last_alert_time = current_time
+                                # Gửi tên tư thế trực tiếp đến hàm play_alert_sound
+                                self.alert_service.play_alert_sound(smoothed_class)
+                                
+                                # Ghi log để debug
+                                logger.info(f"Đã gửi cảnh báo âm thanh cho tư thế: {smoothed_class}")
+                                
+                                # Lưu ảnh chụp
+                                screenshot_path = self.alert_service.save_screenshot(display_frame, smoothed_class)
+                                logger.info(f"Đã lưu ảnh chụp tại: {screenshot_path}")
                             except Exception as e:
                                 logger.error(f"Lỗi khi phát âm thanh cảnh báo: {str(e)}")
                                 import traceback
@@ -217,8 +224,9 @@ class CameraState:
             }
             self.message_queue.put(posture_message)
             
-            # Nếu cần thống kê, gửi thống kê mỗi 5 giây
-            if int(current_time) % 5 == 0 and current_time - int(current_time) < 0.1:  # Mỗi 5 giây
+            # Gửi thống kê định kỳ (không phụ thuộc tần suất phân tích frame)
+            if current_time - self.last_stats_send_time >= self.stats_send_interval:
+                self.last_stats_send_time = current_time
                 stats = self.monitor.get_statistics()
                 stats_message = {
                     "type": "statistics",
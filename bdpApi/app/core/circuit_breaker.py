@@ -0,0 +1,74 @@
+import time
+from typing import Optional
+
+class CircuitBreaker:
+    """Circuit breaker for a flaky remote dependency.
+
+    closed: requests go through; `failure_threshold` consecutive failures open
+    the circuit. open: requests are refused for the backoff window. Once the
+    window has elapsed, exactly one caller wins try_half_open() and runs a
+    trial; its outcome closes the circuit, or reopens it with the backoff
+    doubled (up to `max_reset_timeout`).
+    Not thread-safe: use it from one thread (or one event loop).
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.current_timeout = reset_timeout
+        self.opened_until: Optional[float] = None
+        self.times_opened = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def try_half_open(self) -> bool:
+        """True for the single caller allowed to run the trial request"""
+        if self.state == self.OPEN and time.monotonic() >= self.opened_until:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def retry_in(self) -> float:
+        """Giây còn lại tới khi được thử lại (inf nếu circuit không mở)"""
+        if self.state != self.OPEN:
+            return float("inf")
+        return max(0.0, self.opened_until - time.monotonic())
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.current_timeout = self.reset_timeout
+        self.opened_until = None
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN:
+            # Lần thử thất bại: mở lại với thời gian chờ gấp đôi
+            self.current_timeout = min(self.current_timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self.opened_until = time.monotonic() + self.current_timeout
+        self.times_opened += 1
+
+    def status(self) -> dict:
+        retry_in = self.retry_in()
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "backoff_seconds": self.current_timeout,
+            "retry_in_seconds": None if retry_in == float("inf") else retry_in,
+            "times_opened": self.times_opened,
+        }
@@ -0,0 +1,38 @@
+import base64
+import struct
+from typing import Tuple
+
+# Header của frame nhị phân gửi qua WebSocket:
+# magic (4 byte) | version (1 byte) | format (1 byte) | sequence (uint32, big-endian)
+FRAME_MAGIC = b"BDPF"
+FRAME_VERSION = 1
+FRAME_FORMAT_JPEG = 1
+FRAME_HEADER = struct.Struct("!4sBBI")
+
+TRANSPORT_JSON = "json"
+TRANSPORT_BINARY = "binary"
+TRANSPORTS = (TRANSPORT_JSON, TRANSPORT_BINARY)
+
+def encode_frame_message(jpeg: bytes, sequence: int) -> bytes:
+    """Prefix a JPEG image with the binary frame header"""
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, FRAME_FORMAT_JPEG, sequence & 0xFFFFFFFF)
+    return header + jpeg
+
+def decode_frame_message(message: bytes) -> Tuple[int, int, bytes]:
+    """Split a binary frame message into (format, sequence, payload)"""
+    if len(message) < FRAME_HEADER.size:
+        raise ValueError("Binary frame is shorter than its header")
+    magic, version, frame_format, sequence = FRAME_HEADER.unpack_from(message)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Invalid binary frame magic")
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported binary frame version: {version}")
+    return frame_format, sequence, message[FRAME_HEADER.size:]
+
+def to_data_url(jpeg: bytes) -> str:
+    """Encode JPEG bytes as a data URL for the JSON transport"""
+    return f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('utf-8')}"
+
+def from_data_url(data_url: str) -> bytes:
+    """Decode a base64 data URL (or bare base64 string) back to bytes"""
+    return base64.b64decode(data_url.split(',', 1)[1] if ',' in data_url else data_url)
@@ -0,0 +1,88 @@
+import asyncio
+import queue
+import threading
+from typing import Any, Optional, Tuple
+
+class DropOldestQueue(queue.Queue):
+    """Bounded thread-safe queue that never blocks the producer.
+
+    When the queue is full, put_latest() discards the oldest item to make room,
+    so a slow consumer only ever sees the most recent frames.
+    """
+    
+    def __init__(self, maxsize: int = 1):
+        super().__init__(maxsize=maxsize)
+        self.dropped = 0
+    
+    def put_latest(self, item: Any) -> None:
+        """Put an item, dropping the oldest one if the queue is full"""
+        while True:
+            try:
+                self.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+    
+    def get_or_none(self, timeout: float) -> Optional[Any]:
+        """Wait up to `timeout` seconds for an item, returning None on timeout"""
+        try:
+            return self.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class LatestFrameMailbox:
+    """Single-slot handoff from worker threads to an asyncio event loop.
+    
+    put() may be called from any thread: it overwrites the pending item (drop
+    oldest) and wakes the loop with call_soon_threadsafe. get() must be awaited
+    on the loop; the loop is bound on the first call.
+    """
+    
+    def __init__(self):
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._item = None
+        self._has_item = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+    
+    def put(self, item: Any) -> None:
+        """Store the latest item and wake the waiting coroutine"""
+        with self._lock:
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            loop, event = self._loop, self._event
+        
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(event.set)
+    
+    def _take(self) -> Tuple[bool, Any]:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.get_running_loop()
+                self._event = asyncio.Event()
+            if not self._has_item:
+                return False, None
+            item, self._item, self._has_item = self._item, None, False
+            return True, item
+    
+    async def get(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the next item; raises asyncio.TimeoutError after `timeout` seconds"""
+        while True:
+            found, item = self._take()
+            if found:
+                return item
+            
+            self._event.clear()
+            # Kiểm tra lại sau khi clear để không bỏ lỡ tín hiệu
+            found, item = self._take()
+            if found:
+                return item
+            
+            await asyncio.wait_for(self._event.wait(), timeout)
@@ -1,94 +1,112 @@
+import threading
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Tuple, Any, Optional
-from collections import Counter
+from typing import Deque, Dict, Any
+
+from app.config import BAD_POSTURE_THRESHOLD, POSTURE_HISTORY_SIZE
+from app.core.alert_policy import AlertPolicy
+
+class PostureSample:
+    """Một mẫu trong lịch sử tư thế"""
+    __slots__ = ("timestamp", "posture", "confidence", "dwell", "changed")
+
+    def __init__(self, timestamp: datetime, posture: str, confidence: float):
+        self.timestamp = timestamp
+        self.posture = posture
+        self.confidence = confidence
+        self.dwell = 0.0  # Thời gian tới mẫu kế tiếp (giây), tính cho tư thế của mẫu này
+        self.changed = False  # Tư thế khác mẫu liền trước trong cửa sổ
 
 class PostureMonitor:
-    def __init__(self, bad_posture_threshold=5):  # Thời gian ngưỡng tính bằng giây
-        self.bad_posture_start = None
+    """Posture history over a sliding window of the last `max_history` samples.
+
+    The window is a bounded deque; counts, transitions and per-posture dwell
+    time are updated when a sample enters or leaves it, so update() is O(1)
+    and get_statistics() is O(number of postures) whatever the window size.
+    """
+    def __init__(self, bad_posture_threshold=BAD_POSTURE_THRESHOLD,  # Thời gian ngưỡng tính bằng giây
+                 max_history: int = POSTURE_HISTORY_SIZE):  # Số lượng mẫu tối đa trong lịch sử
         self.bad_posture_threshold = bad_posture_threshold
-        self.alert_active = False
-        self.last_alert_time = None
-        self.alert_cooldown = 10  # Thời gian chờ giữa các cảnh báo (giây)
-        self.posture_history = []
-        self.max_history = 100  # Số lượng mẫu tối đa trong lịch sử
-    
+        # Quyết định cảnh báo dùng chung AlertPolicy với PostureDetectionService
+        self.alert_policy = AlertPolicy(onset=bad_posture_threshold)
+        self.max_history = max_history
+        self.posture_history: Deque[PostureSample] = deque()
+        self.posture_counts: Dict[str, int] = {}
+        self.posture_durations: Dict[str, float] = {}
+        self.transitions = 0
+        # update() chạy trong thread camera, get_statistics() trong event loop
+        self._lock = threading.Lock()
+
     def update(self, posture: str, confidence: float) -> bool:
         current_time = datetime.now()
-        
-        # Thêm vào lịch sử
-        self.posture_history.append((current_time, posture, confidence))
-        if len(self.posture_history) > self.max_history:
-            self.posture_history.pop(0)
-        
-        # Kiểm tra tư thế với hỗ trợ cho phân loại mới
-        is_good_posture = (
-            # Our simplified good postures
-            "right" in posture or 
-            "correct" in posture or
-            posture == "posture" or  # Generic good posture
-            posture.startswith("good_")  # Keep backward compatibility with good_ prefix
-        )
-        
-        # Nếu tư thế không tốt
-        if not is_good_posture:  
-            # Bắt đầu tính thời gian tư thế xấu
-            if self.bad_posture_start is None:
-                self.bad_posture_start = current_time
-            
-            # Kiểm tra xem đã vượt quá ngưỡng chưa
-            elapsed = (current_time - self.bad_posture_start).total_seconds()
-            
-            if elapsed >= self.bad_posture_threshold and not self.alert_active:
-                # Kiểm tra thời gian chờ giữa các cảnh báo
-                if self.last_alert_time is None or (current_time - self.last_alert_time).total_seconds() >= self.alert_cooldown:
-                    self.alert_active = True
-                    self.last_alert_time = current_time
-                    return True  # Kích hoạt cảnh báo
+        sample = PostureSample(current_time, posture, confidence)
+
+        with self._lock:
+            # Thêm vào lịch sử
+            if self.posture_history:
+                previous = self.posture_history[-1]
+                previous.dwell = (current_time - previous.timestamp).total_seconds()
+                self.posture_durations[previous.posture] += previous.dwell
+                if previous.posture != posture:
+                    sample.changed = True
+                    self.transitions += 1
+            self.posture_history.append(sample)
+            self.posture_counts[posture] = self.posture_counts.get(posture, 0) + 1
+            self.posture_durations.setdefault(posture, 0.0)
+
+            if len(self.posture_history) > self.max_history:
+                self._evict_oldest()
+
+        # True đúng một lần cho mỗi đợt tư thế sai
+        return self.alert_policy.update(posture)
+
+    def _evict_oldest(self) -> None:
+        oldest = self.posture_history.popleft()
+        # Chuyển đổi giữa mẫu bị loại và mẫu đầu mới không còn nằm trong cửa sổ
+        head = self.posture_history[0]
+        if head.changed:
+            head.changed = False
+            self.transitions -= 1
+
+        count = self.posture_counts[oldest.posture] - 1
+        if count:
+            self.posture_counts[oldest.posture] = count
+            self.posture_durations[oldest.posture] -= oldest.dwell
         else:
-            # Reset thời gian khi tư thế tốt
-            self.bad_posture_start = None
-            self.alert_active = False
-        
-        return False  # Không cần cảnh báo
+            del self.posture_counts[oldest.posture]
+            del self.posture_durations[oldest.posture]
 
     def get_statistics(self) -> Dict[str, Any]:
         """Tính toán thống kê tư thế"""
-        if not self.posture_history:
-            return {}
-        
-        # Tính tổng thời gian theo dõi
-        start_time = self.posture_history[0][0]
-        end_time = self.posture_history[-1][0]
-        total_time = (end_time - start_time).total_seconds()
-        
-        # Đếm số lần xuất hiện của mỗi tư thế
-        posture_counts = {}
-        for _, posture, _ in self.posture_history:
-            if posture not in posture_counts:
-                posture_counts[posture] = 0
-            posture_counts[posture] += 1
-        
+        with self._lock:
+            if not self.posture_history:
+                return {}
+
+            sample_count = len(self.posture_history)
+            total_time = (self.posture_history[-1].timestamp - self.posture_history[0].timestamp).total_seconds()
+            posture_counts = dict(self.posture_counts)
+            posture_durations = {posture: max(0.0, duration) for posture, duration in self.posture_durations.items()}
+            transitions = self.transitions
+
         # Tính phần trăm
-        posture_percentages = {}
-        for posture, count in posture_counts.items():
-            posture_percentages[posture] = (count / len(self.posture_history)) * 100
-        
-        # Số lần chuyển đổi tư thế
-        transitions = 0
-        for i in range(1, len(self.posture_history)):
-            if self.posture_history[i][1] != self.posture_history[i-1][1]:
-                transitions += 1
-        
+        posture_percentages = {
+            posture: (count / sample_count) * 100
+            for posture, count in posture_counts.items()
+        }
+
         return {
             'total_time': total_time,
             'posture_counts': posture_counts,
             'posture_percentages': posture_percentages,
+            'posture_durations': posture_durations,
             'transitions': transitions
         }
 
     def reset(self) -> None:
         """Reset lịch sử tư thế"""
-        self.posture_history = []
-        self.bad_posture_start = None
-        self.alert_active = False
-        self.last_alert_time = None
+        with self._lock:
+            self.posture_history.clear()
+            self.posture_counts.clear()
+            self.posture_durations.clear()
+            self.transitions = 0
+        self.alert_policy.reset()
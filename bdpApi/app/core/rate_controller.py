@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from app.config import (
+    RATE_TARGET_LATENCY, RATE_MIN_INTERVAL, RATE_MAX_INTERVAL,
+    RATE_STABLE_AFTER, RATE_STABLE_INTERVAL, RATE_CPU_BUDGET
+)
+
+class CpuBudget:
+    """CPU budget shared by every camera stream of the process.
+
+    `cores` is the number of cores the streams may use together. The measured
+    process CPU usage is sampled at most once per second; when it exceeds the
+    budget, `pressure` grows above 1 and every stream slows down.
+    """
+    def __init__(self, fraction: float = RATE_CPU_BUDGET, cpu_count: Optional[int] = None):
+        self.cores = max(1, cpu_count or os.cpu_count() or 1) * fraction
+        self.load = 0.0  # Số core đang được tiến trình sử dụng
+        self._streams = 0
+        self._lock = threading.Lock()
+        self._last_wall = time.monotonic()
+        self._last_cpu = time.process_time()
+
+    @property
+    def streams(self) -> int:
+        return self._streams
+
+    def register(self) -> None:
+        with self._lock:
+            self._streams += 1
+
+    def unregister(self) -> None:
+        with self._lock:
+            self._streams = max(0, self._streams - 1)
+
+    def sample(self) -> None:
+        """Update the measured CPU load of the process"""
+        with self._lock:
+            wall = time.monotonic()
+            elapsed = wall - self._last_wall
+            if elapsed < 1.0:
+                return
+            cpu = time.process_time()
+            self.load = (cpu - self._last_cpu) / elapsed
+            self._last_wall, self._last_cpu = wall, cpu
+
+    @property
+    def pressure(self) -> float:
+        return max(1.0, self.load / self.cores)
+
+    def share(self) -> float:
+        """Cores available to one stream"""
+        return self.cores / max(1, self._streams)
+
+cpu_budget = CpuBudget()
+
+class AdaptiveRateController:
+    """Chooses how often one stream is analyzed.
+
+    While the posture is changing the stream is analyzed as fast as allowed:
+    `min_interval`, raised only when the stream's share of the CPU budget
+    cannot afford it. Once the posture has been stable for `stable_after`
+    seconds the interval relaxes to `stable_interval`, but never beyond what
+    still meets the target end-to-end latency (a posture change waits on
+    average interval / 2 plus the processing time). Stage latencies are
+    tracked as exponential moving averages. Stages are recorded from several
+    threads (inference, encode), so updates are serialized by a lock.
+    """
+    def __init__(self,
+                 budget: CpuBudget = cpu_budget,
+                 target_latency: float = RATE_TARGET_LATENCY,
+                 min_interval: float = RATE_MIN_INTERVAL,
+                 max_interval: float = RATE_MAX_INTERVAL,
+                 stable_after: float = RATE_STABLE_AFTER,
+                 stable_interval: float = RATE_STABLE_INTERVAL,
+                 smoothing: float = 0.2):
+        self.budget = budget
+        self.target_latency = target_latency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stable_after = stable_after
+        self.stable_interval = stable_interval
+        self.smoothing = smoothing
+        self.stage_latency: Dict[str, float] = {}
+        self.interval = min_interval
+        self._last_analysis: Optional[float] = None
+        self._last_posture: Optional[str] = None
+        self._stable_since: Optional[float] = None
+        self._registered = False
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if not self._registered:
+            self.budget.register()
+            self._registered = True
+
+    def stop(self) -> None:
+        if self._registered:
+            self.budget.unregister()
+            self._registered = False
+
+    def should_analyze(self, now: Optional[float] = None) -> bool:
+        """Return True (and mark the analysis time) if the next frame should be analyzed"""
+        now = time.monotonic() if now is None else now
+        if self._last_analysis is not None and now - self._last_analysis < self.interval:
+            return False
+        self._last_analysis = now
+        return True
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        """Record how long a pipeline stage took for one frame"""
+        with self._lock:
+            previous = self.stage_latency.get(stage)
+            if previous is None:
+                self.stage_latency[stage] = seconds
+            else:
+                self.stage_latency[stage] = previous + self.smoothing * (seconds - previous)
+            self._update_interval()
+
+    def record_posture(self, posture: str, now: Optional[float] = None) -> None:
+        """Record the latest predicted posture to detect stable scenes"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if posture != self._last_posture:
+                self._last_posture = posture
+                self._stable_since = now
+            self._update_interval(now)
+
+    @property
+    def processing_time(self) -> float:
+        with self._lock:
+            return sum(self.stage_latency.values())
+
+    def _update_interval(self, now: Optional[float] = None) -> None:
+        """Recompute the interval; the caller holds self._lock"""
+        now = time.monotonic() if now is None else now
+        processing = sum(self.stage_latency.values())
+
+        # Tư thế đang thay đổi: phân tích nhanh nhất có thể
+        interval = self.min_interval
+
+        # Tư thế ổn định lâu thì phân tích thưa hơn, nhưng vẫn đạt độ trễ mục tiêu
+        if self._stable_since is not None and now - self._stable_since >= self.stable_after:
+            latency_limit = 2.0 * (self.target_latency - processing)
+            interval = max(interval, min(self.stable_interval, latency_limit))
+
+        # Không vượt quá phần CPU của luồng này
+        self.budget.sample()
+        interval = max(interval, processing / self.budget.share() * self.budget.pressure)
+
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
@@ -0,0 +1,34 @@
+import numpy as np
+
+class AffineScaler:
+    """Per-feature affine step `x * scale + offset` folded from a fitted sklearn scaler.
+    
+    Replaces scaler.transform() on the hot path, which re-validates its input on
+    every call. Supports StandardScaler and MinMaxScaler (without clip).
+    """
+    def __init__(self, scale, offset):
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.offset = np.asarray(offset, dtype=np.float32)
+    
+    @classmethod
+    def from_sklearn(cls, scaler) -> "AffineScaler":
+        if hasattr(scaler, 'data_min_'):
+            # MinMaxScaler: X * scale_ + min_
+            if getattr(scaler, 'clip', False):
+                raise ValueError("MinMaxScaler with clip=True cannot be folded into an affine step")
+            return cls(scaler.scale_, scaler.min_)
+        
+        if hasattr(scaler, 'with_mean') and hasattr(scaler, 'with_std'):
+            # StandardScaler: (X - mean_) / scale_
+            n_features = int(scaler.n_features_in_)
+            mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+            std = scaler.scale_ if scaler.with_std else np.ones(n_features)
+            scale = 1.0 / np.asarray(std, dtype=np.float64)
+            return cls(scale, -np.asarray(mean, dtype=np.float64) * scale)
+        
+        raise TypeError(f"Unsupported scaler type: {type(scaler).__name__}")
+    
+    def transform(self, x) -> np.ndarray:
+        out = np.multiply(x, self.scale, dtype=np.float32)
+        out += self.offset
+        return out
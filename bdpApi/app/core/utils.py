@@ -5,6 +5,12 @@ import cv2
 
 mp_pose = mp.solutions.pose
 
+# Bố cục landmark của MediaPipe Pose
+POSE_LANDMARK_COUNT = 33
+NECK_LANDMARKS = slice(0, 11)      # Head and face points (0-10)
+POSTURE_LANDMARKS = slice(11, 23)  # Shoulders to hips (11-22)
+LEG_LANDMARKS = slice(23, 33)      # Hip to feet (23-32)
+
 def calculate_angle(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
     """Tính góc giữa ba điểm"""
     ba = a - b
@@ -85,60 +91,52 @@ def extract_features_from_landmarks(landmarks: List) -> List[float]:
     
     return features
 
+def landmarks_to_array(results, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Copy MediaPipe pose landmarks into a (33, 4) float32 array of (x, y, z, visibility).
+    
+    The landmarks are walked once; pass `out` to reuse a preallocated buffer
+    (any float32 array of shape (33, 4), e.g. one row of a batch buffer).
+    Frames without landmarks are filled with zeros.
+    """
+    if out is None:
+        out = np.empty((POSE_LANDMARK_COUNT, 4), dtype=np.float32)
+    
+    if results is None or not results.pose_landmarks:
+        out.fill(0)
+        return out
+    
+    for i, landmark in enumerate(results.pose_landmarks.landmark):
+        out[i] = (landmark.x, landmark.y, landmark.z, landmark.visibility)
+    return out
+
+def split_keypoints(landmarks: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the leg, neck and posture (x, y, z) views of a (..., 33, 4) landmark array.
+    
+    The three regions are contiguous landmark ranges, so these are slicing views
+    of the input: nothing is copied until the caller reshapes them into features.
+    """
+    xyz = landmarks[..., :3]
+    return xyz[..., LEG_LANDMARKS, :], xyz[..., NECK_LANDMARKS, :], xyz[..., POSTURE_LANDMARKS, :]
+
 # Functions from detect_posture.py for specialized keypoint extraction
 def extract_keypoints(results) -> List[float]:
     """Extract keypoints from MediaPipe pose results for general purpose use"""
-    keypoints = []
-    if results.pose_landmarks:
-        for landmark in results.pose_landmarks.landmark:
-            keypoints.extend([landmark.x, landmark.y, landmark.z])
-    else:
-        # If no landmarks detected, return zeros
-        keypoints = [0] * (33 * 3)  # 33 landmarks * 3 coordinates
-    
-    return keypoints
+    return landmarks_to_array(results)[:, :3].ravel().tolist()  # 33 landmarks * 3 coordinates
 
 def extract_leg_keypoints(results) -> List[float]:
     """Extract keypoints for leg model (10 keypoints * 3 coordinates = 30 features)"""
-    leg_keypoints_idx = [23, 24, 25, 26, 27, 28, 29, 30, 31, 32]  # Hip to feet
-    leg_keypoints = []
-    
-    for idx in leg_keypoints_idx:
-        if results.pose_landmarks:
-            point = results.pose_landmarks.landmark[idx]
-            leg_keypoints.extend([point.x, point.y, point.z])
-        else:
-            leg_keypoints.extend([0, 0, 0])
-    
-    return leg_keypoints
+    leg, _, _ = split_keypoints(landmarks_to_array(results))
+    return leg.ravel().tolist()
 
 def extract_neck_keypoints(results) -> List[float]:
     """Extract keypoints for neck model (11 keypoints * 3 coordinates = 33 features)"""
-    neck_keypoints_idx = list(range(0, 11))  # Head and face points (0-10)
-    neck_keypoints = []
-    
-    for idx in neck_keypoints_idx:
-        if results.pose_landmarks:
-            point = results.pose_landmarks.landmark[idx]
-            neck_keypoints.extend([point.x, point.y, point.z])
-        else:
-            neck_keypoints.extend([0, 0, 0])
-    
-    return neck_keypoints
+    _, neck, _ = split_keypoints(landmarks_to_array(results))
+    return neck.ravel().tolist()
 
 def extract_posture_keypoints(results) -> List[float]:
     """Extract keypoints for posture model (12 keypoints * 3 coordinates = 36 features)"""
-    posture_keypoints_idx = list(range(11, 23))  # Shoulders to hips (11-22)
-    posture_keypoints = []
-    
-    for idx in posture_keypoints_idx:
-        if results.pose_landmarks:
-            point = results.pose_landmarks.landmark[idx]
-            posture_keypoints.extend([point.x, point.y, point.z])
-        else:
-            posture_keypoints.extend([0, 0, 0])
-    
-    return posture_keypoints
+    _, _, posture = split_keypoints(landmarks_to_array(results))
+    return posture.ravel().tolist()
 
 def get_pose_results(image, pose_model):
     """Process an image and get MediaPipe pose results"""
@@ -0,0 +1,94 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import WebSocket
+
+from app.config import WS_SEND_QUEUE_SIZE, logger
+
+# Loại tin nhắn chỉ cần giữ bản mới nhất
+COALESCED_TYPES = ("posture_update",)
+# Loại tin nhắn bị bỏ trước tiên khi queue đầy
+DROPPABLE_TYPES = ("detection_result",)
+
+class ClientOutbox:
+    """Outbound queue of one WebSocket client, drained by its own writer task.
+
+    Producers never await the network: put() only enqueues. The queue is
+    bounded; when it is full the oldest detection_result is dropped first (or the
+    oldest message if there is none). posture_update messages are coalesced so
+    only the latest one is ever sent.
+    """
+    def __init__(self, websocket: WebSocket, client_id: str, maxsize: int = WS_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.coalesced = 0
+        self.sent = 0
+        self._queue: Deque[Tuple[dict, Optional[bytes]]] = deque()
+        self._latest: Dict[str, dict] = {}
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    def put(self, message: dict, data: Optional[bytes] = None) -> None:
+        """Queue a JSON message, optionally followed by a binary message sent right after it"""
+        message_type = message.get("type")
+        if data is None and message_type in COALESCED_TYPES:
+            if message_type in self._latest:
+                self.coalesced += 1
+            self._latest[message_type] = message
+            self._wakeup.set()
+            return
+
+        if len(self._queue) >= self.maxsize:
+            self._drop_one()
+        self._queue.append((message, data))
+        self._wakeup.set()
+
+    def _drop_one(self) -> None:
+        for index, (queued, _) in enumerate(self._queue):
+            if queued.get("type") in DROPPABLE_TYPES:
+                del self._queue[index]
+                break
+        else:
+            self._queue.popleft()
+        self.dropped += 1
+
+    def _next(self) -> Optional[Tuple[dict, Optional[bytes]]]:
+        if self._queue:
+            return self._queue.popleft()
+        if self._latest:
+            message_type = next(iter(self._latest))
+            return self._latest.pop(message_type), None
+        return None
+
+    async def _writer(self) -> None:
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                item = self._next()
+                while item is not None:
+                    message, data = item
+                    await self.websocket.send_json(message)
+                    if data is not None:
+                        await self.websocket.send_bytes(data)
+                    self.sent += 1
+                    item = self._next()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"WebSocket writer stopped for client {self.client_id}: {str(e)}")
+
+    def close(self) -> None:
+        """Stop the writer task; queued messages are discarded"""
+        self._task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": len(self._queue) + len(self._latest),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,114 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+def _item_duration_ms(prefix: str = "") -> Dict[str, Any]:
+    """Thời lượng (ms) của một session item; item chưa đóng (end_timestamp = null) tính là 0"""
+    start = f"${prefix}start_timestamp"
+    end = f"${prefix}end_timestamp"
+    return {"$subtract": [{"$ifNull": [end, start]}, start]}
+
+def to_local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Đưa mốc thời gian của query về giờ địa phương không múi giờ, như timestamp đã lưu (datetime.now())"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+BUCKET_FORMATS = {
+    "day": "%Y-%m-%d",
+    "week": "%G-W%V",  # Tuần ISO
+}
+
+def session_summary_pipeline(session_id: ObjectId) -> List[Dict[str, Any]]:
+    """Tổng số mục và tổng thời lượng theo label_id của một phiên"""
+    return [
+        {"$match": {"session_id": session_id}},
+        {"$group": {
+            "_id": "$label_id",
+            "count": {"$sum": 1},
+            "duration_ms": {"$sum": _item_duration_ms()}
+        }},
+        {"$sort": {"duration_ms": -1}}
+    ]
+
+def user_stats_pipeline(user_id: ObjectId, from_date: datetime, to_date: datetime,
+                        bucket: str) -> List[Dict[str, Any]]:
+    """Thời lượng theo (bucket ngày/tuần, label_id) của mọi phiên của một người dùng.
+
+    Chạy trên collection sessions: lọc theo (user_id, creation_date), rồi $lookup
+    các session item có start_timestamp trong [from_date, to_date).
+    """
+    return [
+        # Phiên tạo sau to_date không thể có item trong khoảng thời gian cần tính
+        {"$match": {"user_id": user_id, "creation_date": {"$lt": to_date}}},
+        {"$project": {"_id": 1}},
+        {"$lookup": {
+            "from": "session_items",
+            "let": {"session_id": "$_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$session_id", "$$session_id"]},
+                    {"$gte": ["$start_timestamp", from_date]},
+                    {"$lt": ["$start_timestamp", to_date]}
+                ]}}},
+                {"$project": {"label_id": 1, "start_timestamp": 1, "end_timestamp": 1}}
+            ],
+            "as": "items"
+        }},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "bucket": {"$dateToString": {"format": BUCKET_FORMATS[bucket], "date": "$items.start_timestamp"}},
+                "label_id": "$items.label_id"
+            },
+            "count": {"$sum": 1},
+            "duration_ms": {"$sum": _item_duration_ms("items.")}
+        }},
+        {"$sort": {"_id.bucket": 1}}
+    ]
+
+def posture_samples_pipeline(session_id: ObjectId, from_date: Optional[datetime], to_date: Optional[datetime],
+                             resolution: Optional[int]) -> List[Dict[str, Any]]:
+    """Mẫu tư thế của một phiên từ time-series collection, gộp theo `resolution` giây nếu có.
+
+    Khi gộp: confidence là trung bình, label_id là nhãn của mẫu cuối cùng trong khoảng.
+    """
+    match: Dict[str, Any] = {"meta.session_id": session_id}
+    if from_date or to_date:
+        match["timestamp"] = {}
+        if from_date:
+            match["timestamp"]["$gte"] = from_date
+        if to_date:
+            match["timestamp"]["$lt"] = to_date
+
+    pipeline: List[Dict[str, Any]] = [{"$match": match}, {"$sort": {"timestamp": 1}}]
+    if resolution:
+        pipeline += [
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$timestamp", "unit": "second", "binSize": resolution}},
+                "label_id": {"$last": "$label_id"},
+                "confidence": {"$avg": "$confidence"},
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"_id": 1}},
+            {"$project": {"_id": 0, "timestamp": "$_id", "label_id": 1, "confidence": 1, "count": 1}}
+        ]
+    else:
+        pipeline.append({"$project": {"_id": 0, "timestamp": 1, "label_id": 1, "confidence": 1}})
+    return pipeline
+
+def build_label_stats(groups: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Chuyển các dòng {label_id, count, duration_ms} thành thống kê có phần trăm thời lượng"""
+    stats = [
+        {
+            "label_id": group["label_id"],
+            "count": group["count"],
+            "duration_seconds": group["duration_ms"] / 1000.0
+        }
+        for group in groups
+    ]
+    total = sum(stat["duration_seconds"] for stat in stats)
+    for stat in stats:
+        stat["percentage"] = (stat["duration_seconds"] / total * 100) if total else 0.0
+    return stats
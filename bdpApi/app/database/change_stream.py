@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import logger
+
+class ChangeStreamWatcher:
+    """Background task calling `on_change(change)` for every change of one collection.
+
+    Change streams only exist on a replica set; elsewhere the task logs
+    `unavailable_note` once and ends, and the owner keeps relying on its own
+    invalidation.
+    """
+    def __init__(self, get_collection: Callable[[], Awaitable[Any]],
+                 on_change: Callable[[Dict[str, Any]], None], unavailable_note: str):
+        self.get_collection = get_collection
+        self.on_change = on_change
+        self.unavailable_note = unavailable_note
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _watch(self) -> None:
+        try:
+            collection = await self.get_collection()
+            async with collection.watch() as stream:
+                async for change in stream:
+                    self.on_change(change)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"{self.unavailable_note}: {str(e)}")
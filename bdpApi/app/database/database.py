@@ -3,6 +3,8 @@ from pymongo.database import Database
 from pymongo.collection import Collection
 from contextlib import asynccontextmanager
 
+from app.config import POSTURE_SAMPLES_COLLECTION
+
 # MongoDB connection
 MONGODB_URL = "mongodb://localhost:27017"
 DATABASE_NAME = "detection_system"
@@ -16,6 +18,7 @@ users_collection = db.users
 sessions_collection = db.sessions
 session_items_collection = db.session_items
 labels_collection = db.labels
+posture_samples_collection = db[POSTURE_SAMPLES_COLLECTION]
 
 # Dependency to get DB
 async def get_db():
@@ -37,4 +40,8 @@ async def get_session_items_collection():
 
 async def get_labels_collection():
     """Return labels collection"""
-    return labels_collection 
\ No newline at end of file
+    return labels_collection 
+
+async def get_posture_samples_collection():
+    """Return posture samples time-series collection"""
+    return posture_samples_collection
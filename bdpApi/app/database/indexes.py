@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.config import (
+    POSTURE_SAMPLES_ENABLED, POSTURE_SAMPLES_COLLECTION, POSTURE_SAMPLE_RETENTION_DAYS, logger
+)
+
+# Khai báo toàn bộ index của hệ thống. ensure_indexes() áp dụng danh sách này,
+# create_indexes() bỏ qua index đã tồn tại với cùng key và tên nên chạy lại an toàn.
+INDEX_SPEC: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_1", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_1", unique=True),
+    ],
+    "sessions": [
+        # Danh sách phiên của người dùng, mới nhất trước; thống kê theo khoảng thời gian
+        IndexModel([("user_id", ASCENDING), ("creation_date", DESCENDING)], name="user_id_1_creation_date_-1"),
+    ],
+    "session_items": [
+        # Item của một phiên theo thứ tự (start_timestamp, _id) của phân trang, không cần sort trong bộ nhớ;
+        # dùng cho cả summary và $lookup của thống kê
+        IndexModel(
+            [("session_id", ASCENDING), ("start_timestamp", ASCENDING), ("_id", ASCENDING)],
+            name="session_id_1_start_timestamp_1__id_1"
+        ),
+        IndexModel([("label_id", ASCENDING)], name="label_id_1"),
+        # Kiểm tra file ảnh còn được tham chiếu khi xóa phiên
+        IndexModel([("image_ref", ASCENDING)], name="image_ref_1", sparse=True),
+    ],
+    "labels": [
+        IndexModel([("label_id", ASCENDING)], name="label_id_1", unique=True),
+        IndexModel([("name", ASCENDING)], name="name_1", unique=True),
+    ],
+}
+
+# Index cũ không còn dùng:
+# - datetime_1: không document nào có trường datetime
+# - label_name_1: label_name vẫn được ghi nhưng không truy vấn nào lọc theo nó
+# - user_id_1, creation_date_1, session_id_1, session_id_1_start_timestamp_1:
+#   tiền tố của (hoặc được thay bằng) index kép ở trên
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    "sessions": ["user_id_1", "creation_date_1"],
+    "session_items": ["session_id_1", "session_id_1_start_timestamp_1", "datetime_1", "label_name_1"],
+}
+
+def hot_queries() -> List[Tuple[str, str, Dict[str, Any], Optional[List[Tuple[str, int]]]]]:
+    """Các truy vấn nóng (name, collection, filter, sort) phải dùng index.
+
+    Giá trị trong filter chỉ là mẫu; explain() chỉ quan tâm tới hình dạng truy vấn.
+    """
+    sample_id = ObjectId()
+    now = datetime.now()
+    return [
+        ("sessions by user", "sessions",
+         {"user_id": sample_id}, [("creation_date", DESCENDING)]),
+        ("sessions by user in range", "sessions",
+         {"user_id": sample_id, "creation_date": {"$lt": now}}, [("creation_date", DESCENDING)]),
+        ("session items by session", "session_items",
+         {"session_id": sample_id}, [("start_timestamp", ASCENDING), ("_id", ASCENDING)]),
+        ("session items by session in range", "session_items",
+         {"session_id": sample_id, "start_timestamp": {"$gte": now, "$lt": now}}, None),
+        ("session items by image", "session_items",
+         {"image_ref": {"$in": ["sample"]}}, None),
+        ("user by username", "users", {"username": "sample"}, None),
+        ("label by label_id", "labels", {"label_id": "sample"}, None),
+    ]
+
+class IndexVerificationError(RuntimeError):
+    """Một truy vấn nóng không dùng được index (COLLSCAN) hoặc phải sort trong bộ nhớ (SORT)"""
+
+async def ensure_indexes(db) -> None:
+    """Apply INDEX_SPEC and drop OBSOLETE_INDEXES; safe to run on every startup"""
+    for collection_name, obsolete in OBSOLETE_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for index_name in obsolete:
+            if index_name in existing:
+                await db[collection_name].drop_index(index_name)
+                logger.info(f"Dropped obsolete index {collection_name}.{index_name}")
+
+    for collection_name, indexes in INDEX_SPEC.items():
+        await db[collection_name].create_indexes(indexes)
+
+    if POSTURE_SAMPLES_ENABLED:
+        await ensure_posture_samples_collection(db)
+    logger.info("MongoDB indexes are up to date")
+
+async def ensure_posture_samples_collection(db) -> None:
+    """Create the posture samples time-series collection, or update its TTL if it exists.
+
+    Mẫu được gom theo metaField {session_id, user_id} nên MongoDB lưu nhiều mẫu
+    trong một bucket nén, không tạo một document và một khóa index cho mỗi giây.
+    """
+    expire_after_seconds = int(POSTURE_SAMPLE_RETENTION_DAYS * 24 * 3600)
+    existing = await db.list_collection_names(filter={"name": POSTURE_SAMPLES_COLLECTION})
+    if existing:
+        await db.command("collMod", POSTURE_SAMPLES_COLLECTION, expireAfterSeconds=expire_after_seconds)
+    else:
+        await db.create_collection(
+            POSTURE_SAMPLES_COLLECTION,
+            timeseries={"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"},
+            expireAfterSeconds=expire_after_seconds
+        )
+        logger.info(f"Created time-series collection {POSTURE_SAMPLES_COLLECTION}")
+    await db[POSTURE_SAMPLES_COLLECTION].create_index(
+        [("meta.session_id", ASCENDING), ("timestamp", ASCENDING)], name="meta.session_id_1_timestamp_1"
+    )
+
+def _plan_stages(plan: Dict[str, Any]) -> Iterable[str]:
+    """Tất cả các stage trong một cây kế hoạch truy vấn"""
+    yield plan.get("stage", "")
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+async def verify_hot_queries(db) -> None:
+    """Run explain() on every hot query and raise if any of them falls back to COLLSCAN,
+    or, for queries with a sort, to an in-memory SORT stage"""
+    failures = []
+    for name, collection_name, query, sort in hot_queries():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.limit(1).explain()
+        winning_plan = explanation["queryPlanner"]["winningPlan"]
+        # MongoDB 7+ với slot-based engine lồng plan trong queryPlan
+        winning_plan = winning_plan.get("queryPlan", winning_plan)
+        stages = list(_plan_stages(winning_plan))
+        if "COLLSCAN" in stages or (sort and "SORT" in stages):
+            failures.append(f"{name} ({collection_name}: {' <- '.join(stages)})")
+
+    if failures:
+        raise IndexVerificationError(
+            "Hot queries fall back to a collection scan or an in-memory sort: " + "; ".join(failures)
+        )
+    logger.info(f"Verified {len(hot_queries())} hot queries use an index")
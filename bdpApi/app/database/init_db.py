@@ -2,6 +2,8 @@ import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime
 
+from app.database.indexes import ensure_indexes, verify_hot_queries
+
 # MongoDB connection settings
 MONGODB_URL = "mongodb://localhost:27017"
 DATABASE_NAME = "detection_system"
@@ -15,23 +17,9 @@ async def init_mongodb():
     # Create collections if they don't exist
     # (MongoDB creates collections automatically when you insert data)
     
-    # Create indexes on users collection
-    await db.users.create_index("username", unique=True)
-    await db.users.create_index("email", unique=True)
-    
-    # Create indexes on sessions collection
-    await db.sessions.create_index("user_id")
-    await db.sessions.create_index("creation_date")
-    
-    # Create indexes on session_items collection
-    await db.session_items.create_index("session_id")
-    await db.session_items.create_index("datetime")
-    await db.session_items.create_index("label_name")
-    await db.session_items.create_index("label_id")
-    
-    # Create indexes on labels collection
-    await db.labels.create_index("label_id", unique=True)
-    await db.labels.create_index("name", unique=True)
+    # Create indexes declared in app.database.indexes and check the hot queries use them
+    await ensure_indexes(db)
+    await verify_hot_queries(db)
     
     # Insert default labels if they don't exist
     default_labels = [
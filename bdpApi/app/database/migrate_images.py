@@ -0,0 +1,120 @@
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from app.config import SCREENSHOTS_DIR
+from app.core.frame_codec import from_data_url
+from app.database.database import MONGODB_URL, DATABASE_NAME
+from app.services.image_store import store_image, image_ref_to_path
+
+BATCH_SIZE = 100
+
+def _legacy_path(image_path) -> Optional[Path]:
+    """Resolved legacy screenshot path of an item, only if it lies inside SCREENSHOTS_DIR"""
+    if not isinstance(image_path, str) or not image_path:
+        return None
+    path = Path(image_path).resolve()
+    if Path(SCREENSHOTS_DIR).resolve() not in path.parents:
+        return None
+    return path
+
+def _restore_image(item: Dict[str, Any], stored: Dict[Path, str]) -> Tuple[str, Optional[Path]]:
+    """Store the image of a legacy item by content hash; return (image_ref, legacy file to remove)"""
+    legacy_path = _legacy_path(item.get("image_path"))
+    if legacy_path is not None and legacy_path in stored:
+        # File cũ đã được chuyển cho một item trước đó
+        return stored[legacy_path], None
+    if legacy_path is not None and not legacy_path.is_file():
+        legacy_path = None
+    if isinstance(item.get("image"), str):
+        jpeg = from_data_url(item["image"])
+    elif legacy_path is not None:
+        jpeg = legacy_path.read_bytes()
+    else:
+        raise FileNotFoundError(f"image file not found: {item.get('image_path')}")
+    image_ref = store_image(jpeg)
+    if legacy_path is None or legacy_path == image_ref_to_path(image_ref).resolve():
+        return image_ref, None
+    stored[legacy_path] = image_ref
+    return image_ref, legacy_path
+
+def _remove_files(paths: List[Path]) -> int:
+    removed = 0
+    for path in paths:
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+async def migrate_embedded_images():
+    """Move legacy session_item images to content-addressed files in SCREENSHOTS_DIR.
+
+    Legacy items carry the image embedded as base64 (`image`) and/or point to
+    a file through `image_path` but have no image_ref. Each image is stored by
+    content hash; the document keeps only image_ref (and image_path) and loses
+    its `image` field. The legacy file is removed once its items point to the
+    new file, so nothing outside image_ref is left on disk. Safe to run more
+    than once.
+    """
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+
+    cursor = db.session_items.find(
+        {
+            "image_ref": {"$exists": False},
+            "$or": [{"image": {"$type": "string"}}, {"image_path": {"$type": "string"}}]
+        },
+        projection={"image": 1, "image_path": 1},
+        batch_size=BATCH_SIZE
+    )
+
+    operations = []
+    legacy_files: List[Path] = []
+    stored: Dict[Path, str] = {}  # File cũ -> image_ref, cho các item dùng chung một file
+    migrated = 0
+    failed = 0
+    removed = 0
+
+    async def write_batch():
+        nonlocal operations, legacy_files, migrated, removed
+        await db.session_items.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+        # Chỉ xóa file cũ sau khi document đã trỏ sang file mới
+        removed += await asyncio.to_thread(_remove_files, legacy_files)
+        operations, legacy_files = [], []
+
+    async for item in cursor:
+        try:
+            image_ref, legacy_path = await asyncio.to_thread(_restore_image, item, stored)
+        except Exception as e:
+            print(f"Error migrating image of session item {item['_id']}: {str(e)}")
+            failed += 1
+            continue
+
+        operations.append(UpdateOne(
+            {"_id": item["_id"]},
+            {
+                "$set": {"image_ref": image_ref, "image_path": str(image_ref_to_path(image_ref))},
+                "$unset": {"image": ""}
+            }
+        ))
+        if legacy_path is not None:
+            legacy_files.append(legacy_path)
+        if len(operations) >= BATCH_SIZE:
+            await write_batch()
+            print(f"Migrated {migrated} images...")
+
+    if operations:
+        await write_batch()
+
+    print(f"Image migration finished: {migrated} migrated, {failed} failed, {removed} legacy files removed.")
+    client.close()
+
+if __name__ == "__main__":
+    # Run the async function
+    asyncio.run(migrate_embedded_images())
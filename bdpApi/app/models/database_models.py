@@ -108,8 +108,9 @@ class SessionItemModel(BaseModel):
     session_id: PyObjectId
     timestamp: datetime = Field(default_factory=datetime.now)
     accuracy: float
-    image: Optional[str] = None  # Base64 encoded image
+    image: Optional[str] = None  # Base64 encoded image (chỉ khi IMAGE_STORAGE_MODE = "embedded")
     image_path: Optional[str] = None  # Path to local image file
+    image_ref: Optional[str] = None  # Content-addressed reference inside SCREENSHOTS_DIR
     start_timestamp: datetime
     end_timestamp: Optional[datetime] = None
     label_name: str
@@ -129,6 +130,8 @@ class SessionItemResponseModel(BaseModel):
     accuracy: float
     image: Optional[str] = None
     image_path: Optional[str] = None
+    image_ref: Optional[str] = None
+    image_url: Optional[str] = None  # URL dưới /screenshots
     start_timestamp: datetime
     end_timestamp: Optional[datetime] = None
     label_name: str
@@ -141,4 +144,56 @@ class SessionItemResponseModel(BaseModel):
     }
 
 class SessionDetailModel(SessionResponseModel):
-    items: List[SessionItemResponseModel] = [] 
\ No newline at end of file
+    items: List[SessionItemResponseModel] = []
+    next_cursor: Optional[str] = None
+
+class SessionItemsPageModel(BaseModel):
+    items: List[Dict[str, Any]] = []
+    next_cursor: Optional[str] = None
+
+class LabelStatModel(BaseModel):
+    label_id: str
+    count: int
+    duration_seconds: float
+    percentage: float = 0.0
+
+class SessionSummaryModel(BaseModel):
+    session_id: str
+    item_count: int
+    total_duration_seconds: float
+    labels: List[LabelStatModel] = []
+
+class StatsBucketModel(BaseModel):
+    bucket: str  # "YYYY-MM-DD" (ngày) hoặc "YYYY-Www" (tuần ISO)
+    total_duration_seconds: float
+    labels: List[LabelStatModel] = []
+
+class UserStatsModel(BaseModel):
+    user_id: str
+    from_date: datetime
+    to_date: datetime
+    bucket: str
+    total_duration_seconds: float
+    labels: List[LabelStatModel] = []
+    buckets: List[StatsBucketModel] = []
+
+class SessionBulkDeleteModel(BaseModel):
+    older_than_days: Optional[int] = Field(default=None, ge=0)  # Xóa các phiên tạo trước N ngày
+    session_ids: Optional[List[str]] = None  # Hoặc xóa theo danh sách ID
+
+class SessionDeleteJobModel(BaseModel):
+    job_id: str
+    description: str
+    status: str  # pending | running | completed | failed
+    sessions_deleted: int = 0
+    items_deleted: int = 0
+    files_deleted: int = 0
+    error: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+class PostureSampleModel(BaseModel):
+    timestamp: datetime
+    label_id: str
+    confidence: float
+    count: int = 1  # Số mẫu được gộp khi có resolution
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Dict, List, Any, Optional
 
 class CameraRequest(BaseModel):
@@ -18,9 +18,10 @@ class PostureInfo(BaseModel):
     angles: Optional[Dict[str, float]] = None
 
 class FrameData(BaseModel):
-    image: str
+    image: Optional[str] = None  # Data URL, chỉ tạo khi client dùng transport JSON
     posture: PostureInfo
     timestamp: str
+    jpeg: Optional[bytes] = Field(default=None, exclude=True)  # Ảnh JPEG gốc, không serialize
 
 class PostureUpdateData(BaseModel):
     posture: PostureInfo
@@ -34,4 +35,5 @@ class WebSocketCommand(BaseModel):
     action: str
     camera_id: Optional[int] = 0
     camera_url: Optional[str] = None
-    check_alert: Optional[bool] = False
\ No newline at end of file
+    check_alert: Optional[bool] = False
+    transport: Optional[str] = "json"  # "json" (ảnh base64 trong JSON) hoặc "binary"
\ No newline at end of file
@@ -0,0 +1,230 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Optional
+
+import httpx
+
+from app.config import (
+    ESP32_AUDIO_SERVER, ESP32_PROBE_INTERVAL, ESP32_PROBE_TIMEOUT, ESP32_REQUEST_TIMEOUT,
+    ALERT_QUEUE_SIZE, ALERT_DISPATCHER_START_TIMEOUT, ESP32_FAILURE_THRESHOLD, ESP32_BREAKER_RESET_TIMEOUT, ESP32_BREAKER_MAX_RESET_TIMEOUT,
+    logger
+)
+from app.core.circuit_breaker import CircuitBreaker
+
+class AlertDispatcher:
+    """Sends alert commands to the ESP32 audio server without blocking the caller.
+
+    The dispatcher owns a small event loop in a daemon thread, so it can be used
+    from the capture/inference threads as well as from FastAPI coroutines:
+    dispatch() only hands the track to a bounded queue and returns. A worker
+    sends the commands through one shared httpx.AsyncClient (keep-alive
+    connections), and a periodic probe of /status keeps the ESP32 state up to
+    date, so alerts no longer probe the ESP32 before every command.
+
+    Failed commands and probes feed a circuit breaker: while it is open, alerts
+    go straight to `fallback(track_id)` without touching the network, and
+    after the backoff window a single /status probe decides whether to close it.
+    If the dispatcher thread cannot start, dispatch() plays the fallback directly.
+    """
+    def __init__(self, server_url: str = ESP32_AUDIO_SERVER,
+                 probe_interval: float = ESP32_PROBE_INTERVAL,
+                 queue_size: int = ALERT_QUEUE_SIZE):
+        self.server_url = server_url
+        self.probe_interval = probe_interval
+        self.queue_size = queue_size
+        self.breaker = CircuitBreaker(
+            failure_threshold=ESP32_FAILURE_THRESHOLD,
+            reset_timeout=ESP32_BREAKER_RESET_TIMEOUT,
+            max_reset_timeout=ESP32_BREAKER_MAX_RESET_TIMEOUT
+        )
+        self.last_probe_time: Optional[float] = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.short_circuited = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._thread: Optional[threading.Thread] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        self._start_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._running = False
+
+    @property
+    def esp32_available(self) -> bool:
+        return self.breaker.closed
+
+    def start(self, timeout: float = ALERT_DISPATCHER_START_TIMEOUT) -> bool:
+        """Start the dispatcher thread (idempotent); True once it accepts alerts"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._ready.clear()
+                self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                self._thread.start()
+        if not self._ready.wait(timeout):
+            logger.error(f"Alert dispatcher did not start within {timeout}s")
+            return False
+        return self._running
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker and the probe, close the HTTP client"""
+        loop = self._loop
+        if loop is None or self._thread is None:
+            return
+        try:
+            # Hủy worker thay vì gửi tín hiệu dừng qua queue: queue có thể đang đầy
+            loop.call_soon_threadsafe(self._cancel_worker)
+        except RuntimeError:
+            pass  # Vòng lặp đã đóng
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Alert dispatcher did not stop within {timeout}s")
+            return
+        self._thread = None
+
+    def _cancel_worker(self) -> None:
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+
+    def dispatch(self, track_id: int, fallback: Callable[[int], None]) -> None:
+        """Queue an alert; safe to call from any thread, never blocks"""
+        if self.start():
+            loop = self._loop
+            try:
+                loop.call_soon_threadsafe(self._enqueue, track_id, fallback)
+                return
+            except (AttributeError, RuntimeError):
+                pass  # Vòng lặp vừa dừng
+        # Không gửi được qua dispatcher: phát cục bộ ngay
+        self._run_fallback(fallback, track_id)
+
+    def _enqueue(self, track_id: int, fallback: Callable[[int], None]) -> None:
+        try:
+            self._queue.put_nowait((track_id, fallback))
+        except asyncio.QueueFull:
+            # Cảnh báo cũ đang chờ đã đủ báo cho người dùng, bỏ cảnh báo mới
+            self.dropped += 1
+            logger.warning(f"Alert queue full, dropping alert track {track_id}")
+
+    def _run(self) -> None:
+        loop = None
+        try:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            loop.run_until_complete(self._main())
+        except Exception as e:
+            logger.error(f"Alert dispatcher stopped: {str(e)}")
+        finally:
+            self._running = False
+            # Luôn đánh thức start() kể cả khi khởi động lỗi
+            self._ready.set()
+            self._loop = None
+            if loop is not None:
+                loop.close()
+
+    async def _main(self) -> None:
+        self._client = httpx.AsyncClient(
+            base_url=self.server_url,
+            timeout=ESP32_REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=1)
+        )
+        probe_task = asyncio.create_task(self._probe_periodically())
+        self._running = True
+        self._ready.set()
+        self._worker_task = asyncio.create_task(self._worker())
+        try:
+            await self._worker_task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._worker_task = None
+            probe_task.cancel()
+            await asyncio.gather(probe_task, return_exceptions=True)
+            await self._client.aclose()
+
+    async def _worker(self) -> None:
+        while True:
+            track_id, fallback = await self._queue.get()
+            if not await self._send(track_id):
+                self._run_fallback(fallback, track_id)
+
+    async def _send(self, track_id: int) -> bool:
+        """Gửi lệnh phát tới ESP32; trả về False nếu cần phát dự phòng"""
+        if not self.breaker.closed:
+            # Mạch đang ngắt: phát cục bộ ngay, không chờ timeout
+            self.short_circuited += 1
+            return False
+        try:
+            response = await self._client.get("/play", params={"track": track_id})
+            if response.status_code == 200:
+                self.sent += 1
+                self.breaker.record_success()
+                logger.info(f"ESP32 đã nhận lệnh phát âm thanh track {track_id}")
+                return True
+            logger.warning(f"ESP32 phản hồi lỗi: {response.status_code} - {response.text}")
+        except Exception as e:
+            logger.error(f"Không thể kết nối đến ESP32: {str(e)}")
+        self.failed += 1
+        self._record_failure()
+        return False
+
+    def _record_failure(self) -> None:
+        was_closed = self.breaker.closed
+        self.breaker.record_failure()
+        if was_closed and not self.breaker.closed:
+            logger.warning(
+                f"ESP32 lỗi {self.breaker.consecutive_failures} lần liên tiếp, "
+                f"phát âm thanh từ backend trong {self.breaker.current_timeout:.0f}s"
+            )
+
+    @staticmethod
+    def _run_fallback(fallback: Callable[[int], None], track_id: int) -> None:
+        try:
+            fallback(track_id)
+        except Exception as e:
+            logger.error(f"Lỗi khi phát âm thanh dự phòng: {e}")
+
+    async def probe(self) -> bool:
+        """Kiểm tra /status của ESP32 và cập nhật circuit breaker"""
+        try:
+            response = await self._client.get("/status", timeout=ESP32_PROBE_TIMEOUT)
+            available = response.status_code == 200
+        except Exception:
+            available = False
+        self.last_probe_time = time.time()
+        if available:
+            if not self.breaker.closed:
+                logger.info("ESP32 audio server available again, closing circuit")
+            self.breaker.record_success()
+        else:
+            self._record_failure()
+        return available
+
+    async def _probe_periodically(self) -> None:
+        try:
+            while True:
+                # Khi mạch mở, chỉ một lần thử (half-open) sau khi hết thời gian chờ
+                if self.breaker.closed or self.breaker.try_half_open():
+                    await self.probe()
+                await asyncio.sleep(min(self.probe_interval, self.breaker.retry_in()))
+        except asyncio.CancelledError:
+            pass
+
+    def status(self) -> dict:
+        return {
+            "server_url": self.server_url,
+            "esp32_available": self.esp32_available,
+            "circuit": self.breaker.status(),
+            "last_probe_time": self.last_probe_time,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "short_circuited": self.short_circuited,
+        }
+
+alert_dispatcher = AlertDispatcher()
@@ -1,22 +1,69 @@
 # bdpApi/app/services/alert_service.py
 import os
+import threading
 import pygame
 import logging
 import cv2
-import httpx
 from datetime import datetime
-from typing import Optional
+from pathlib import Path
+from typing import Dict, Optional
 
-from app.config import AUDIO_ALERTS_DIR, SCREENSHOTS_DIR, logger, ESP32_AUDIO_SERVER
+from app.config import AUDIO_ALERTS_DIR, SCREENSHOTS_DIR, logger
+from app.services.alert_dispatcher import alert_dispatcher
 
 class AlertService:
+    """Process-wide alert service; use the `alert_service` instance below.
+
+    The pygame mixer is initialized once, and every `track_*.mp3` in
+    AUDIO_ALERTS_DIR is decoded once by load_sounds() into a pygame.mixer.Sound,
+    so the local fallback plays from memory on a free mixer channel.
+    """
     def __init__(self):
-        # Khởi tạo pygame để phát âm thanh (phương án dự phòng)
-        pygame.mixer.init()
+        self._sounds: Dict[str, pygame.mixer.Sound] = {}
+        self._mixer_ready = False
+        self._lock = threading.Lock()
+    
+    def _ensure_mixer(self) -> bool:
+        """Khởi tạo pygame mixer đúng một lần (phương án dự phòng)"""
+        if not self._mixer_ready:
+            try:
+                pygame.mixer.init()
+                self._mixer_ready = True
+            except Exception as e:
+                logger.error(f"Không khởi tạo được pygame mixer: {e}")
+        return self._mixer_ready
+    
+    def load_sounds(self) -> int:
+        """Giải mã trước tất cả track_*.mp3 trong AUDIO_ALERTS_DIR vào bộ nhớ"""
+        with self._lock:
+            if not self._ensure_mixer():
+                return 0
+            for sound_path in sorted(Path(AUDIO_ALERTS_DIR).glob("track_*.mp3")):
+                try:
+                    self._sounds[sound_path.stem] = pygame.mixer.Sound(str(sound_path))
+                except Exception as e:
+                    logger.error(f"Không tải được âm thanh {sound_path}: {e}")
+            logger.info(f"Đã tải {len(self._sounds)} âm thanh cảnh báo vào bộ nhớ")
+            return len(self._sounds)
+    
+    def _get_sound(self, sound_name: str) -> Optional[pygame.mixer.Sound]:
+        """Âm thanh đã tải; file thêm sau khi khởi động được tải ở lần dùng đầu tiên"""
+        sound = self._sounds.get(sound_name)
+        if sound is not None:
+            return sound
+        with self._lock:
+            if sound_name in self._sounds:
+                return self._sounds[sound_name]
+            sound_path = os.path.join(AUDIO_ALERTS_DIR, f"{sound_name}.mp3")
+            if not os.path.exists(sound_path) or not self._ensure_mixer():
+                return None
+            sound = pygame.mixer.Sound(sound_path)
+            self._sounds[sound_name] = sound
+            return sound
     
     # Sửa lại định nghĩa hàm - đưa ra khỏi __init__
     def play_alert_sound(self, sound_name: str = "alert.mp3") -> None:
-        """Phát âm thanh cảnh báo"""
+        """Phát âm thanh cảnh báo (chỉ đưa vào hàng đợi của alert_dispatcher, không chờ mạng)"""
         try:
             # Map tên tư thế sang ID track
             track_id = self.map_posture_to_track(sound_name)
@@ -27,7 +74,7 @@ class AlertService:
             # Gửi lệnh phát âm thanh đến ESP32 với track_id đã được ánh xạ
             self.send_audio_command_to_esp32(track_id)
             
-            logger.info(f"Đã gửi lệnh phát âm thanh: {sound_name} (Track {track_id})")
+            logger.info(f"Đã đưa lệnh phát âm thanh vào hàng đợi: {sound_name} (Track {track_id})")
         except Exception as e:
             logger.error(f"Lỗi khi phát âm thanh: {e}")
             # Thử phát âm thanh cục bộ nếu gửi lệnh đến ESP32 thất bại
@@ -36,13 +83,13 @@ class AlertService:
     def _play_local_sound(self, sound_name: str) -> None:
         """Phát âm thanh từ backend (phương án dự phòng)"""
         try:
-            sound_path = os.path.join(AUDIO_ALERTS_DIR, f"{sound_name}.mp3")
-            if os.path.exists(sound_path):
-                pygame.mixer.music.load(sound_path)
-                pygame.mixer.music.play()
-                logger.info(f"Đã phát âm thanh cục bộ: {sound_path}")
+            sound = self._get_sound(sound_name)
+            if sound is not None:
+                # Lấy kênh trống (hoặc kênh phát lâu nhất nếu tất cả đều bận)
+                pygame.mixer.find_channel(True).play(sound)
+                logger.info(f"Đã phát âm thanh cục bộ: {sound_name}")
             else:
-                logger.warning(f"Không tìm thấy file âm thanh: {sound_path}")
+                logger.warning(f"Không tìm thấy file âm thanh: {sound_name}.mp3")
         except Exception as e:
             logger.error(f"Lỗi khi phát âm thanh cục bộ: {e}")
         
@@ -70,39 +117,15 @@ class AlertService:
         return 2
     
     def check_esp32_connection(self) -> bool:
-        """Kiểm tra kết nối với ESP32"""
-        try:
-            url = f"{ESP32_AUDIO_SERVER}/status"
-            response = httpx.get(url, timeout=1.0)
-            return response.status_code == 200
-        except Exception:
-            return False
+        """Trạng thái kết nối ESP32 theo lần kiểm tra định kỳ gần nhất"""
+        return alert_dispatcher.esp32_available
 
     def send_audio_command_to_esp32(self, track_id: int) -> None:
-        """Gửi lệnh phát âm thanh đến ESP32"""
-        try:
-            # Kiểm tra kết nối trước
-            if not self.check_esp32_connection():
-                logger.warning("ESP32 không phản hồi, chuyển sang phát âm thanh từ backend")
-                self._play_local_sound(f"track_{track_id}")
-                return
-                
-            url = f"{ESP32_AUDIO_SERVER}/play?track={track_id}"
-            
-            # Sử dụng httpx.get đồng bộ với timeout ngắn
-            response = httpx.get(url, timeout=2.0)
-            
-            if response.status_code == 200:
-                logger.info(f"ESP32 đã nhận lệnh phát âm thanh track {track_id}")
-            else:
-                logger.warning(f"ESP32 phản hồi lỗi: {response.status_code} - {response.text}")
-                # Phát âm thanh từ backend nếu ESP32 phản hồi lỗi
-                self._play_local_sound(f"track_{track_id}")
-                
-        except Exception as e:
-            logger.error(f"Không thể kết nối đến ESP32: {str(e)}")
-            # Phát âm thanh từ backend nếu không kết nối được ESP32
-            self._play_local_sound(f"track_{track_id}")
+        """Gửi lệnh phát âm thanh đến ESP32 qua alert_dispatcher; tự phát cục bộ nếu ESP32 lỗi"""
+        alert_dispatcher.dispatch(track_id, self._play_local_track)
+    
+    def _play_local_track(self, track_id: int) -> None:
+        self._play_local_sound(f"track_{track_id}")
     
     def save_screenshot(self, frame, posture: str) -> Optional[str]:
         """Lưu ảnh chụp tư thế sai"""
@@ -115,3 +138,5 @@ class AlertService:
         except Exception as e:
             logger.error(f"Lỗi khi lưu ảnh chụp: {e}")
             return None
+
+alert_service = AlertService()
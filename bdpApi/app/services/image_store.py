@@ -0,0 +1,37 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+from app.config import SCREENSHOTS_DIR
+
+# URL của thư mục screenshots đã được mount trong main.py
+SCREENSHOTS_URL = "/screenshots"
+
+def store_image(jpeg: bytes) -> str:
+    """Save a JPEG under SCREENSHOTS_DIR by content hash and return its reference.
+
+    The reference is the path relative to SCREENSHOTS_DIR ("ab/abcdef....jpg"),
+    so identical frames are stored once and a reference never changes meaning.
+    """
+    digest = hashlib.sha256(jpeg).hexdigest()
+    image_ref = f"{digest[:2]}/{digest}.jpg"
+    image_path = image_ref_to_path(image_ref)
+    if not image_path.exists():
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        # Ghi ra file tạm rồi đổi tên để không bao giờ lộ file ghi dở
+        tmp_path = image_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(jpeg)
+        os.replace(tmp_path, image_path)
+    return image_ref
+
+def image_ref_to_path(image_ref: str) -> Path:
+    """Absolute path of a stored image"""
+    return Path(SCREENSHOTS_DIR) / image_ref
+
+def image_ref_to_url(image_ref: Optional[str]) -> Optional[str]:
+    """URL under the /screenshots mount for a stored image"""
+    if not image_ref:
+        return None
+    return f"{SCREENSHOTS_URL}/{image_ref}"
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from app.config import logger
+from app.database.change_stream import ChangeStreamWatcher
+from app.database.database import get_labels_collection
+
+class LabelCache:
+    """Process-wide in-memory copy of the labels collection.
+
+    The label catalog is tiny and rarely changes, so it is loaded once (at
+    startup or on first use) and served from memory to the detection loop and
+    the /labels endpoints. The create/update/delete handlers call invalidate();
+    when MongoDB runs as a replica set, a change stream invalidates it as well.
+    `etag` identifies the current catalog version for If-None-Match.
+    """
+    def __init__(self):
+        self._labels: Dict[str, dict] = {}
+        self._loaded = False
+        # Tăng mỗi lần invalidate(); load() bắt đầu trước đó không được đánh dấu cache là mới
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        # Change stream chỉ có trên replica set; khi đó chỉ dựa vào invalidate() từ API
+        self._watcher = ChangeStreamWatcher(
+            get_labels_collection, lambda change: self.invalidate(),
+            "Label change stream unavailable, relying on API invalidation"
+        )
+        self.etag: Optional[str] = None
+
+    async def load(self) -> None:
+        """(Re)load every label from MongoDB"""
+        async with self._lock:
+            generation = self._generation
+            labels_collection = await get_labels_collection()
+            labels = {}
+            async for label in labels_collection.find():
+                labels[label["label_id"]] = label
+            self._labels = labels
+            self.etag = self._compute_etag(labels)
+            # Bị invalidate trong lúc đọc: dữ liệu có thể đã cũ, để lần đọc sau nạp lại
+            self._loaded = generation == self._generation
+            logger.info(f"Loaded {len(labels)} labels into cache")
+
+    async def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            await self.load()
+
+    def invalidate(self) -> None:
+        """Mark the cache stale; the next read reloads it"""
+        self._generation += 1
+        self._loaded = False
+
+    async def get(self, label_id: str) -> Optional[dict]:
+        await self._ensure_loaded()
+        return self._labels.get(label_id)
+
+    async def list(self) -> List[dict]:
+        await self._ensure_loaded()
+        return list(self._labels.values())
+
+    async def get_etag(self) -> str:
+        await self._ensure_loaded()
+        return self.etag
+
+    @staticmethod
+    def _compute_etag(labels: Dict[str, dict]) -> str:
+        payload = json.dumps(
+            [labels[label_id] for label_id in sorted(labels)],
+            default=str, sort_keys=True
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def start_watching(self) -> None:
+        """Invalidate the cache on every change of the labels collection (replica set only)"""
+        self._watcher.start()
+
+    async def stop_watching(self) -> None:
+        await self._watcher.stop()
+
+label_cache = LabelCache()
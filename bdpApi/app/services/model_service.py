@@ -5,17 +5,81 @@ import numpy as np
 import logging
 import asyncio
 import cv2
-import base64
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from typing import Dict, Tuple, Any, List, Optional
 import mediapipe as mp
 from datetime import datetime
 
-from app.config import MODELS_DIR, logger
+from app.config import (
+    MODELS_DIR, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_BATCH_WAIT, INFERENCE_BACKEND, MODEL_IDLE_UNLOAD_AFTER,
+    PIPELINE_QUEUE_SIZE, PIPELINE_POLL_TIMEOUT, logger
+)
+from app.core.pipeline import DropOldestQueue, LatestFrameMailbox
+from app.core.alert_policy import AlertPolicy
+from app.core.rate_controller import AdaptiveRateController
+from app.core.scaler import AffineScaler
+from app.core.utils import POSE_LANDMARK_COUNT, landmarks_to_array, split_keypoints
 from app.models.schemas import FrameData, PostureInfo
 
+INFERENCE_BACKENDS = ("keras", "tf_function", "tflite")
+
+class CompiledClassifier:
+    """Callable wrapper around a Keras classifier that skips the predict() machinery.
+    
+    - "tf_function": the model call is traced once with a fixed [None, n_features]
+      float32 signature, so every call reuses the same graph.
+    - "tflite": the model is converted to TFLite and run by an Interpreter on CPU.
+    - "keras": plain model.predict(), kept as a reference/fallback.
+    """
+    def __init__(self, model, backend: str = "tf_function"):
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend}")
+        self.model = model
+        self.backend = backend
+        self.n_features = int(model.input_shape[-1])
+        
+        if backend == "tf_function":
+            self._fn = tf.function(
+                lambda x: model(x, training=False),
+                input_signature=[tf.TensorSpec(shape=[None, self.n_features], dtype=tf.float32)]
+            )
+        elif backend == "tflite":
+            converter = tf.lite.TFLiteConverter.from_keras_model(model)
+            self._interpreter = tf.lite.Interpreter(model_content=converter.convert())
+            self._input_index = self._interpreter.get_input_details()[0]['index']
+            self._output_index = self._interpreter.get_output_details()[0]['index']
+            self._batch_size = None
+            # Interpreter không an toàn đa luồng
+            self._interpreter_lock = threading.Lock()
+        
+        # Warm up so the first real frame does not pay for tracing/allocation
+        self(np.zeros((1, self.n_features), dtype=np.float32))
+    
+    def __call__(self, x) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        if self.backend == "tf_function":
+            return self._fn(x).numpy()
+        if self.backend == "tflite":
+            with self._interpreter_lock:
+                if self._batch_size != x.shape[0]:
+                    self._interpreter.resize_tensor_input(self._input_index, list(x.shape))
+                    self._interpreter.allocate_tensors()
+                    self._batch_size = x.shape[0]
+                self._interpreter.set_tensor(self._input_index, x)
+                self._interpreter.invoke()
+                return self._interpreter.get_tensor(self._output_index).copy()
+        return self.model.predict(x, batch_size=len(x), verbose=0)
+
 class ModelService:
-    def __init__(self):
+    def __init__(self, backend: str = INFERENCE_BACKEND):
+        self.backend = backend
         self.models = {}
+        self.classifiers = {}
+        self.scalers = {}
+        self._buffers = threading.local()
         self.posture_classes = []
         self.leg_classes = []
         self.neck_classes = []
@@ -85,49 +149,160 @@ class ModelService:
                 self.leg_classes = ["correct_leg", "incorrect_leg"]
                 self.neck_classes = ["correct_neck", "incorrect_neck"]
             
+            # Fold the sklearn scalers into affine steps
+            for name in ('scaler_posture', 'scaler_leg', 'scaler_neck'):
+                if name in self.models:
+                    self.scalers[name] = self._fuse_scaler(name, self.models[name])
+            
+            # Wrap the classifiers for the configured inference backend
+            for name in ('posture_model', 'leg_model', 'neck_model'):
+                if name in self.models:
+                    self.classifiers[name] = self._compile_classifier(name, self.models[name])
+            
             logger.info(f"Successfully loaded {len(self.models)} models and components")
             
         except Exception as e:
             logger.error(f"Error loading models: {str(e)}")
     
+    def _fuse_scaler(self, name: str, scaler):
+        """Return an AffineScaler matching `scaler`, or the sklearn scaler itself if parity fails"""
+        try:
+            fused = AffineScaler.from_sklearn(scaler)
+            
+            # Parity check against sklearn on random probe rows
+            rng = np.random.default_rng(0)
+            probe = rng.normal(size=(8, fused.scale.shape[0]))
+            expected = scaler.transform(probe)
+            actual = fused.transform(probe)
+            if not np.allclose(actual, expected, rtol=1e-4, atol=1e-4):
+                max_error = float(np.max(np.abs(actual - expected)))
+                logger.warning(f"Fused {name} differs from sklearn (max error {max_error}), keeping sklearn transform")
+                return scaler
+            
+            return fused
+        except Exception as e:
+            logger.warning(f"Cannot fuse {name}, keeping sklearn transform: {str(e)}")
+            return scaler
+    
+    def _compile_classifier(self, name: str, model) -> CompiledClassifier:
+        """Build the classifier for the configured backend, falling back towards plain Keras"""
+        backends = [self.backend] + [b for b in ("tf_function", "keras") if b != self.backend]
+        for backend in backends:
+            try:
+                classifier = CompiledClassifier(model, backend)
+                logger.info(f"{name} uses inference backend: {backend}")
+                return classifier
+            except Exception as e:
+                logger.error(f"Cannot build {backend} backend for {name}: {str(e)}")
+        raise RuntimeError(f"No usable inference backend for {name}")
+    
+    def _landmark_buffer(self, batch_size: int) -> np.ndarray:
+        """Reusable (batch_size, 33, 4) float32 buffer, one per calling thread"""
+        buffer = getattr(self._buffers, 'landmarks', None)
+        if buffer is None or buffer.shape[0] < batch_size:
+            buffer = np.zeros((batch_size, POSE_LANDMARK_COUNT, 4), dtype=np.float32)
+            self._buffers.landmarks = buffer
+        return buffer[:batch_size]
+    
+    def extract_batch_keypoints(self, results_list: List[Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Fill the landmark buffer from many MediaPipe results and return per-head features.
+        
+        Returns leg (N, 30), neck (N, 33) and posture (N, 36) feature matrices.
+        """
+        landmarks = self._landmark_buffer(len(results_list))
+        for i, results in enumerate(results_list):
+            landmarks_to_array(results, out=landmarks[i])
+        
+        batch_size = len(results_list)
+        leg, neck, posture = split_keypoints(landmarks)
+        return (leg.reshape(batch_size, -1),
+                neck.reshape(batch_size, -1),
+                posture.reshape(batch_size, -1))
+    
     def extract_and_preprocess_keypoints(self, results):
         """Extract and preprocess keypoints for all models as done in detect_posture.py"""
-        # Extract keypoints for leg model (10 keypoints * 3 coordinates = 30 features)
-        leg_keypoints_idx = [23, 24, 25, 26, 27, 28, 29, 30, 31, 32]  # Hip to feet
-        leg_keypoints = []
-        for idx in leg_keypoints_idx:
-            if results.pose_landmarks:
-                point = results.pose_landmarks.landmark[idx]
-                leg_keypoints.extend([point.x, point.y, point.z])
-            else:
-                leg_keypoints.extend([0, 0, 0])
+        # Shapes: leg (1, 30), neck (1, 33), posture (1, 36)
+        return self.extract_batch_keypoints([results])
+    
+    def _decode_prediction(self, leg_pred_row, neck_pred_row, posture_pred_row) -> Tuple[str, float]:
+        """Combine the three model outputs of one frame into a single posture label"""
+        # Process results just like in detect_posture.py
+        # First check leg position
+        leg_prob = leg_pred_row[0]
+        leg_correct = leg_prob <= 0.5  # Below 0.5 means correct leg position
         
-        # Extract keypoints for neck model (11 keypoints * 3 coordinates = 33 features)
-        neck_keypoints_idx = list(range(0, 11))  # Head and face points (0-10)
-        neck_keypoints = []
-        for idx in neck_keypoints_idx:
-            if results.pose_landmarks:
-                point = results.pose_landmarks.landmark[idx]
-                neck_keypoints.extend([point.x, point.y, point.z])
+        if leg_correct:
+            # Check posture
+            max_posture_idx = np.argmax(posture_pred_row)
+            current_posture = self.posture_classes[max_posture_idx]
+            
+            # Check if this is a "good" posture
+            is_good_posture = current_posture.startswith("good_")
+            
+            if is_good_posture:
+                # Check neck position
+                max_neck_idx = np.argmax(neck_pred_row)
+                
+                # Only if neck is correct, indicate fully correct posture
+                if max_neck_idx == 0:  # Correct neck position
+                    return current_posture, float(posture_pred_row[max_posture_idx])
+                else:
+                    # Neck is incorrect
+                    return self.neck_classes[max_neck_idx], float(neck_pred_row[max_neck_idx])
             else:
-                neck_keypoints.extend([0, 0, 0])
+                # Posture is incorrect
+                return current_posture, float(posture_pred_row[max_posture_idx])
+        else:
+            # Leg position is incorrect
+            return self.leg_classes[1], float(leg_prob)
+    
+    def predict_posture_batch(self, results_list: List[Any]) -> List[Tuple[str, float]]:
+        """Predict postures for many MediaPipe results at once.
         
-        # Extract keypoints for posture model (12 keypoints * 3 coordinates = 36 features)
-        posture_keypoints_idx = list(range(11, 23))  # Shoulders to hips (11-22)
-        posture_keypoints = []
-        for idx in posture_keypoints_idx:
-            if results.pose_landmarks:
-                point = results.pose_landmarks.landmark[idx]
-                posture_keypoints.extend([point.x, point.y, point.z])
-            else:
-                posture_keypoints.extend([0, 0, 0])
+        Keypoints of all frames are stacked per head, each scaler runs once on the
+        whole batch and each model is called once, instead of three predict() calls
+        per frame.
+        """
+        if not results_list:
+            return []
         
-        # Reshape arrays to match model input shapes
-        leg_keypoints = np.array(leg_keypoints).reshape(1, -1)  # Shape: (1, 30)
-        neck_keypoints = np.array(neck_keypoints).reshape(1, -1)  # Shape: (1, 33)
-        posture_keypoints = np.array(posture_keypoints).reshape(1, -1)  # Shape: (1, 36)
+        unknown = [("unknown", 0.0)] * len(results_list)
+        try:
+            if not self.models:
+                logger.error("Models not loaded. Cannot make predictions.")
+                return unknown
+            
+            # Check if all necessary models and scalers are loaded
+            required_components = ['posture_model', 'leg_model', 'neck_model', 
+                                 'scaler_posture', 'scaler_leg', 'scaler_neck']
+            if not all(comp in self.models for comp in required_components):
+                logger.error("Missing required model components")
+                return unknown
+            
+            # Landmarks of every frame go into one buffer, sliced per head
+            leg_batch, neck_batch, posture_batch = self.extract_batch_keypoints(results_list)
+            
+            # Normalize each head in one vectorized affine pass
+            leg_batch = self.scalers['scaler_leg'].transform(leg_batch)
+            neck_batch = self.scalers['scaler_neck'].transform(neck_batch)
+            posture_batch = self.scalers['scaler_posture'].transform(posture_batch)
+            
+            # One call per compiled classifier for the whole batch
+            batch_size = len(results_list)
+            leg_pred = self.classifiers['leg_model'](leg_batch)
+            neck_pred = self.classifiers['neck_model'](neck_batch)
+            posture_pred = self.classifiers['posture_model'](posture_batch)
+            
+            return [
+                self._decode_prediction(leg_pred[i], neck_pred[i], posture_pred[i])
+                for i in range(batch_size)
+            ]
         
-        return leg_keypoints, neck_keypoints, posture_keypoints
+        except Exception as e:
+            logger.error(f"Error predicting posture batch: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return unknown
     
     def predict_posture(self, features=None, results=None):
         """Predict posture using the models - can accept either features or MediaPipe results"""
@@ -136,58 +311,9 @@ class ModelService:
                 logger.error("Models not loaded. Cannot make predictions.")
                 return "unknown", 0.0
             
-            # If we have MediaPipe results, extract keypoints from them
+            # If we have MediaPipe results, run them through the batched path
             if results and hasattr(results, 'pose_landmarks'):
-                leg_keypoints, neck_keypoints, posture_keypoints = self.extract_and_preprocess_keypoints(results)
-                
-                # Check if all necessary models and scalers are loaded
-                required_components = ['posture_model', 'leg_model', 'neck_model', 
-                                     'scaler_posture', 'scaler_leg', 'scaler_neck']
-                if not all(comp in self.models for comp in required_components):
-                    logger.error("Missing required model components")
-                    return "unknown", 0.0
-                
-                # Normalize keypoints using appropriate scalers
-                leg_keypoints_normalized = self.models['scaler_leg'].transform(leg_keypoints)
-                neck_keypoints_normalized = self.models['scaler_neck'].transform(neck_keypoints)
-                posture_keypoints_normalized = self.models['scaler_posture'].transform(posture_keypoints)
-                
-                # Make predictions
-                leg_pred = self.models['leg_model'].predict(leg_keypoints_normalized, verbose=0)
-                neck_pred = self.models['neck_model'].predict(neck_keypoints_normalized, verbose=0)
-                posture_pred = self.models['posture_model'].predict(posture_keypoints_normalized, verbose=0)
-                
-                # Process results just like in detect_posture.py
-                # First check leg position
-                leg_prob = leg_pred[0][0]
-                leg_correct = leg_prob <= 0.5  # Below 0.5 means correct leg position
-                
-                if leg_correct:
-                    # Check posture
-                    posture_probs = posture_pred[0]
-                    max_posture_idx = np.argmax(posture_probs)
-                    current_posture = self.posture_classes[max_posture_idx]
-                    
-                    # Check if this is a "good" posture
-                    is_good_posture = current_posture.startswith("good_")
-                    
-                    if is_good_posture:
-                        # Check neck position
-                        neck_probs = neck_pred[0]
-                        max_neck_idx = np.argmax(neck_probs)
-                        
-                        # Only if neck is correct, indicate fully correct posture
-                        if max_neck_idx == 0:  # Correct neck position
-                            return current_posture, float(posture_probs[max_posture_idx])
-                        else:
-                            # Neck is incorrect
-                            return self.neck_classes[max_neck_idx], float(neck_probs[max_neck_idx])
-                    else:
-                        # Posture is incorrect
-                        return current_posture, float(posture_probs[max_posture_idx])
-                else:
-                    # Leg position is incorrect
-                    return self.leg_classes[1], float(leg_prob)
+                return self.predict_posture_batch([results])[0]
             
             # Legacy support for old feature-based prediction
             elif features:
@@ -217,17 +343,173 @@ class ModelService:
             logger.error(traceback.format_exc())
             return "unknown", 0.0
 
+class BatchInferenceEngine:
+    """Collects frames submitted by many detection threads and predicts them in batches.
+    
+    Each caller gets a Future; a single worker thread drains the request queue,
+    waiting at most `max_wait` seconds to fill a batch of up to `max_batch_size`.
+    """
+    def __init__(self, model_service: ModelService,
+                 max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+                 max_wait: float = INFERENCE_MAX_BATCH_WAIT):
+        self.model_service = model_service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        self._stopped = False
+        self._stop_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._worker_loop, name="batch-inference", daemon=True)
+        self._worker.start()
+    
+    def submit(self, results) -> Future:
+        """Queue MediaPipe results for prediction and return a Future of (posture, confidence)"""
+        future = Future()
+        with self._stop_lock:
+            if self._stopped:
+                future.set_exception(RuntimeError("Batch inference engine is stopped"))
+            else:
+                self._requests.put((results, future))
+        return future
+    
+    def predict(self, results, timeout: Optional[float] = None) -> Tuple[str, float]:
+        """Blocking helper for capture threads"""
+        return self.submit(results).result(timeout=timeout)
+    
+    def stop(self) -> None:
+        """Stop the worker thread once pending requests are served"""
+        with self._stop_lock:
+            if not self._stopped:
+                self._stopped = True
+                self._requests.put(None)
+    
+    def _worker_loop(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait
+            
+            # Gom thêm request cho tới khi đủ batch hoặc hết thời gian chờ
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    # Giữ lại tín hiệu dừng cho vòng lặp ngoài
+                    self._requests.put(None)
+                    break
+                batch.append(request)
+            
+            try:
+                predictions = self.model_service.predict_posture_batch([results for results, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+
+class ModelRegistry:
+    """Process-wide, reference-counted owner of the loaded models.
+    
+    Models are loaded once, on the first acquire(), behind a lock so concurrent
+    "start" commands never load twice. Every detection service and the camera
+    state share the same ModelService and BatchInferenceEngine. When the last
+    reference is released the models stay loaded for `idle_unload_after`
+    seconds (forever if None), so a stop followed by a start reuses them.
+    acquire() may load models for seconds: call it off the event loop.
+    """
+    def __init__(self, idle_unload_after: Optional[float] = MODEL_IDLE_UNLOAD_AFTER):
+        self.idle_unload_after = idle_unload_after
+        self._lock = threading.Lock()
+        self._model_service: Optional[ModelService] = None
+        self._inference_engine: Optional[BatchInferenceEngine] = None
+        self._ref_count = 0
+        self._unload_timer: Optional[threading.Timer] = None
+    
+    @property
+    def ref_count(self) -> int:
+        return self._ref_count
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._model_service is not None
+    
+    def acquire(self) -> ModelService:
+        """Take a reference to the shared ModelService, loading it on first use"""
+        with self._lock:
+            self._cancel_unload()
+            if self._model_service is None:
+                logger.info("Loading shared posture models")
+                self._model_service = ModelService()
+                self._inference_engine = BatchInferenceEngine(self._model_service)
+            self._ref_count += 1
+            return self._model_service
+    
+    def release(self) -> None:
+        """Drop a reference taken with acquire(); unload after the idle grace period"""
+        with self._lock:
+            if self._ref_count == 0:
+                return
+            self._ref_count -= 1
+            if self._ref_count == 0 and self.idle_unload_after is not None:
+                timer = threading.Timer(self.idle_unload_after, self._unload_if_idle)
+                timer.daemon = True
+                self._unload_timer = timer
+                timer.start()
+    
+    def get_inference_engine(self) -> BatchInferenceEngine:
+        """Return the shared batch inference engine; the caller must hold a reference"""
+        with self._lock:
+            if self._inference_engine is None:
+                raise RuntimeError("Posture models are not loaded, call acquire() first")
+            return self._inference_engine
+    
+    def _cancel_unload(self) -> None:
+        if self._unload_timer is not None:
+            self._unload_timer.cancel()
+            self._unload_timer = None
+    
+    def _unload_if_idle(self) -> None:
+        with self._lock:
+            # Timer đã bị hủy hoặc có người acquire() lại trong lúc chờ
+            if self._unload_timer is not threading.current_thread() or self._ref_count > 0:
+                return
+            self._unload_timer = None
+            if self._model_service is not None:
+                logger.info("Unloading idle shared posture models")
+                self._inference_engine.stop()
+                self._inference_engine = None
+                self._model_service = None
+
+model_registry = ModelRegistry()
+
 class PostureDetectionService:
-    def __init__(self, camera_id=0, camera_url=None):
+    def __init__(self, camera_id=0, camera_url=None, alert_policy: Optional[AlertPolicy] = None):
         self.camera_id = camera_id
         self.camera_url = camera_url
-        self.model_service = ModelService()
+        self.model_service = model_registry.acquire()
+        self.inference_engine = model_registry.get_inference_engine()
+        self._model_released = False
         self.running = False
         self.cap = None
-        self.frame_queue = asyncio.Queue(maxsize=10)
-        from app.services.alert_service import AlertService
-        self.alert_service = AlertService()
-        self.last_alert_time = None
+        # Chỉ giữ frame mới nhất cho event loop, an toàn khi gọi từ thread khác
+        self.frame_mailbox = LatestFrameMailbox()
+        # Queue giữa các stage: capture -> inference -> encode, cộng với stage cảnh báo
+        self.capture_queue = DropOldestQueue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.encode_queue = DropOldestQueue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.alert_queue = DropOldestQueue(maxsize=1)
+        self.rate_controller = AdaptiveRateController()
+        self.threads: List[threading.Thread] = []
+        from app.services.alert_service import alert_service
+        self.alert_service = alert_service
+        self.alert_policy = alert_policy or AlertPolicy()
         # MediaPipe setup
         self.mp_pose = mp.solutions.pose
         self.mp_drawing = mp.solutions.drawing_utils
@@ -245,6 +527,7 @@ class PostureDetectionService:
         if not self.running:
             logger.info(f"Starting camera capture with camera ID: {self.camera_id}")
             self.running = True
+            self.rate_controller.start()
             
             # Xử lý camera dựa trên loại camera
             if self.camera_id == 1 and not self.camera_url:
@@ -261,22 +544,33 @@ class PostureDetectionService:
                 logger.info(f"Using local camera with index: {self.camera_id}")
                 self.cap = cv2.VideoCapture(self.camera_id)
             
-            # Start the frame processing loop in a separate thread
-            import threading
-            self.capture_thread = threading.Thread(target=self._capture_loop)
-            self.capture_thread.daemon = True
-            self.capture_thread.start()
+            # Start one thread per pipeline stage
+            self.threads = [
+                threading.Thread(target=self._capture_loop, name="pipeline-capture", daemon=True),
+                threading.Thread(target=self._inference_loop, name="pipeline-inference", daemon=True),
+                threading.Thread(target=self._encode_loop, name="pipeline-encode", daemon=True),
+                threading.Thread(target=self._alert_loop, name="pipeline-alert", daemon=True),
+            ]
+            for thread in self.threads:
+                thread.start()
     
     def stop(self):
         """Stop the detection service"""
         self.running = False
-        if self.capture_thread and self.capture_thread.is_alive():
-            self.capture_thread.join(timeout=2.0)
+        for thread in self.threads:
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=2.0)
+        self.rate_controller.stop()
         
         if self.cap:
             self.cap.release()
             self.cap = None
         
+        # Trả lại tham chiếu tới model dùng chung
+        if not self._model_released:
+            model_registry.release()
+            self._model_released = True
+        
         # Fix the MediaPipe error by adding a check
         try:
             if self.pose and hasattr(self.pose, '_graph') and self.pose._graph is not None:
@@ -287,14 +581,13 @@ class PostureDetectionService:
         logger.info("Posture detection service stopped")
     
     def _capture_loop(self):
-        """Background thread loop for capturing and processing frames"""
+        """Capture stage: read frames from the camera and hand them to the inference stage"""
         if not self.cap or not self.cap.isOpened():
             logger.error(f"Failed to open camera with ID: {self.camera_id}")
             if self.camera_id == 1:
                 logger.error(f"Check if the IP camera URL is correct: {self.camera_url}")
             return
         
-        frame_count = 0
         reconnect_attempts = 0
         max_reconnect_attempts = 5
         
@@ -311,7 +604,6 @@ class PostureDetectionService:
                         self.cap.release()
                     
                     # Chờ 2 giây trước khi thử lại
-                    import time
                     time.sleep(2)
                     
                     self.cap = cv2.VideoCapture(self.camera_url)
@@ -325,12 +617,23 @@ class PostureDetectionService:
             # Reset reconnect counter on successful frame capture
             reconnect_attempts = 0
             
-            # Skip frames to reduce CPU usage (process every 3rd frame)
-            frame_count += 1
-            if frame_count % 3 != 0:
+            # Bộ điều khiển quyết định frame nào được phân tích
+            if not self.rate_controller.should_analyze():
+                continue
+            
+            # Không chờ stage sau: nếu queue đầy thì bỏ frame cũ nhất
+            self.capture_queue.put_latest(frame)
+    
+    def _inference_loop(self):
+        """Inference stage: run MediaPipe and the posture models on captured frames"""
+        while self.running:
+            frame = self.capture_queue.get_or_none(timeout=PIPELINE_POLL_TIMEOUT)
+            if frame is None:
                 continue
             
             try:
+                started = time.monotonic()
+                
                 # Convert BGR to RGB
                 rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 
@@ -347,59 +650,67 @@ class PostureDetectionService:
                     )
                 
                 # Get posture prediction
-                posture_class, confidence = self.model_service.predict_posture(results=results)
+                posture_class, confidence = self.inference_engine.predict(results)
+                self.rate_controller.record_stage("inference", time.monotonic() - started)
+                self.rate_controller.record_posture(posture_class)
                 
-                # Convert frame to base64 for transmission
-                _, buffer = cv2.imencode('.jpg', annotated_frame)
-                base64_image = f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
+                # One dispatch per bad-posture episode, decided by the session's alert policy
+                if self.alert_policy.update(posture_class):
+                    # Phát cảnh báo ở stage riêng để HTTP call không chặn suy luận
+                    self.alert_queue.put_latest(posture_class)
+                needs_alert = self.alert_policy.alerting
                 
-                # Determine if this posture needs an alert (anything not 'good_')
-                is_good_posture = (
-                    posture_class.startswith("good_") or 
-                    "right" in posture_class or 
-                    "correct" in posture_class
-                )
-                needs_alert = not is_good_posture
-                if needs_alert:
-                    current_time = datetime.now()
-                    if self.last_alert_time is None or (current_time - self.last_alert_time).total_seconds() > 5.0:
-                        try:
-                            logger.info(f"Phát hiện tư thế cần cảnh báo: {posture_class}, phát âm thanh")
-                            self.alert_service.play_alert_sound(posture_class)
-                            self.last_alert_time = current_time
-                        except Exception as e:
-                            logger.error(f"Lỗi khi phát âm thanh cảnh báo: {str(e)}")
-                # Prepare the frame data
+                # Prepare the posture info
                 posture_info = PostureInfo(
                     posture=posture_class,
                     confidence=float(confidence),
                     need_alert=needs_alert
                 )
                 
+                self.encode_queue.put_latest((annotated_frame, posture_info, datetime.now().isoformat()))
+                
+            except Exception as e:
+                logger.error(f"Error processing frame: {str(e)}")
+    
+    def _encode_loop(self):
+        """Encode stage: JPEG encode annotated frames and publish them"""
+        while self.running:
+            item = self.encode_queue.get_or_none(timeout=PIPELINE_POLL_TIMEOUT)
+            if item is None:
+                continue
+            
+            annotated_frame, posture_info, timestamp = item
+            try:
+                started = time.monotonic()
+                
+                # Encode to JPEG only; base64 is produced later for JSON clients that need it
+                _, buffer = cv2.imencode('.jpg', annotated_frame)
+                self.rate_controller.record_stage("encode", time.monotonic() - started)
+                
                 frame_data = FrameData(
-                    image=base64_image,
+                    jpeg=buffer.tobytes(),
                     posture=posture_info,
-                    timestamp=datetime.now().isoformat()
+                    timestamp=timestamp
                 )
                 
-                # Put the processed frame in the queue
-                try:
-                    # Use put_nowait to avoid blocking
-                    self.frame_queue.put_nowait(frame_data)
-                except asyncio.QueueFull:
-                    # If queue is full, remove oldest item and add new one
-                    try:
-                        self.frame_queue.get_nowait()
-                        self.frame_queue.put_nowait(frame_data)
-                    except Exception:
-                        pass
+                # Hand the frame to the event loop, replacing any unread one
+                self.frame_mailbox.put(frame_data)
                 
             except Exception as e:
-                logger.error(f"Error processing frame: {str(e)}")
+                logger.error(f"Error encoding frame: {str(e)}")
+    
+    def _alert_loop(self):
+        """Alert stage: play alert sounds without holding up the other stages"""
+        while self.running:
+            posture_class = self.alert_queue.get_or_none(timeout=PIPELINE_POLL_TIMEOUT)
+            if posture_class is None:
+                continue
             
-            # Sleep a bit to control the frame rate
-            import time
-            time.sleep(0.05)
+            try:
+                logger.info(f"Phát hiện tư thế cần cảnh báo: {posture_class}, phát âm thanh")
+                self.alert_service.play_alert_sound(posture_class)
+            except Exception as e:
+                logger.error(f"Lỗi khi phát âm thanh cảnh báo: {str(e)}")
     
     async def get_next_frame(self):
         """Get the next processed frame as a FrameData object"""
@@ -408,7 +719,7 @@ class PostureDetectionService:
         
         try:
             # Wait for the next frame with a timeout
-            frame_data = await asyncio.wait_for(self.frame_queue.get(), timeout=5.0)
+            frame_data = await self.frame_mailbox.get(timeout=5.0)
             return frame_data
         except asyncio.TimeoutError:
             logger.warning("Timeout waiting for next frame")
@@ -0,0 +1,161 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from bson import ObjectId
+
+from app.config import SESSION_DELETE_BATCH_SIZE, POSTURE_SAMPLES_ENABLED, logger
+from app.database.database import (
+    client, get_sessions_collection, get_session_items_collection, get_posture_samples_collection
+)
+from app.services.image_store import image_ref_to_path
+
+# Số job xóa giữ lại trong bộ nhớ để tra cứu tiến độ
+MAX_TRACKED_JOBS = 100
+
+class SessionDeleteJob:
+    """Progress of one bulk session delete"""
+    def __init__(self, user_id: str, description: str):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.description = description
+        self.status = "pending"  # pending | running | completed | failed
+        self.sessions_deleted = 0
+        self.items_deleted = 0
+        self.files_deleted = 0
+        self.error: Optional[str] = None
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "description": self.description,
+            "status": self.status,
+            "sessions_deleted": self.sessions_deleted,
+            "items_deleted": self.items_deleted,
+            "files_deleted": self.files_deleted,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class SessionCleanupService:
+    """Cascade delete of sessions, their items and their screenshot files.
+
+    Sessions are deleted in batches of `batch_size`: only the _ids of one batch
+    and the image references of its items are held in memory at a time. Items
+    and sessions of a batch are deleted in one transaction when MongoDB runs as
+    a replica set, otherwise items first so a failure never leaves orphans.
+    Screenshot files are content-addressed and may be shared by several items,
+    so a file is removed only when no remaining item references it; removal
+    runs in a worker thread.
+    """
+    def __init__(self, batch_size: int = SESSION_DELETE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._jobs: "OrderedDict[str, SessionDeleteJob]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        self._supports_transactions: Optional[bool] = None
+
+    async def delete_sessions(self, query: Dict[str, Any],
+                              job: Optional[SessionDeleteJob] = None) -> SessionDeleteJob:
+        """Delete every session matching `query` (must include user_id) with its items and files"""
+        job = job or SessionDeleteJob(str(query.get("user_id")), "delete sessions")
+        job.status = "running"
+        sessions_collection = await get_sessions_collection()
+        session_items_collection = await get_session_items_collection()
+        try:
+            while True:
+                batch = await sessions_collection.find(query, projection={"_id": 1}).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+                session_ids = [session["_id"] for session in batch]
+                image_refs = await session_items_collection.distinct(
+                    "image_ref", {"session_id": {"$in": session_ids}, "image_ref": {"$type": "string"}}
+                )
+
+                items_deleted = await self._delete_batch(session_ids, sessions_collection, session_items_collection)
+                if POSTURE_SAMPLES_ENABLED:
+                    # Time-series collection không ghi được trong transaction; mẫu còn sót cũng hết hạn theo TTL
+                    posture_samples_collection = await get_posture_samples_collection()
+                    await posture_samples_collection.delete_many({"meta.session_id": {"$in": session_ids}})
+                job.sessions_deleted += len(session_ids)
+                job.items_deleted += items_deleted
+                job.files_deleted += await self._delete_unreferenced_files(image_refs, session_items_collection)
+                logger.info(
+                    f"Delete job {job.job_id}: {job.sessions_deleted} sessions, "
+                    f"{job.items_deleted} items, {job.files_deleted} files deleted"
+                )
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Delete job {job.job_id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now()
+        return job
+
+    def start_delete(self, query: Dict[str, Any], user_id: str, description: str) -> SessionDeleteJob:
+        """Run delete_sessions() in the background and return its job for progress polling"""
+        job = SessionDeleteJob(user_id, description)
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > MAX_TRACKED_JOBS:
+            self._jobs.popitem(last=False)
+
+        task = asyncio.create_task(self.delete_sessions(query, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[SessionDeleteJob]:
+        return self._jobs.get(job_id)
+
+    async def _delete_batch(self, session_ids: List[ObjectId], sessions_collection, session_items_collection) -> int:
+        if await self._transactions_available():
+            async with await client.start_session() as db_session:
+                async with db_session.start_transaction():
+                    result = await session_items_collection.delete_many(
+                        {"session_id": {"$in": session_ids}}, session=db_session
+                    )
+                    await sessions_collection.delete_many({"_id": {"$in": session_ids}}, session=db_session)
+                    return result.deleted_count
+
+        result = await session_items_collection.delete_many({"session_id": {"$in": session_ids}})
+        await sessions_collection.delete_many({"_id": {"$in": session_ids}})
+        return result.deleted_count
+
+    async def _transactions_available(self) -> bool:
+        """Transactions need a replica set or a sharded cluster"""
+        if self._supports_transactions is None:
+            try:
+                hello = await client.admin.command("hello")
+                self._supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+            except Exception:
+                self._supports_transactions = False
+        return self._supports_transactions
+
+    async def _delete_unreferenced_files(self, image_refs: List[str], session_items_collection) -> int:
+        if not image_refs:
+            return 0
+        # Ảnh trùng nội dung dùng chung một file: giữ lại file còn được item khác tham chiếu
+        still_referenced = set(await session_items_collection.distinct(
+            "image_ref", {"image_ref": {"$in": image_refs}}
+        ))
+        orphaned = [image_ref for image_ref in image_refs if image_ref not in still_referenced]
+        return await asyncio.to_thread(_remove_image_files, orphaned)
+
+def _remove_image_files(image_refs: Iterable[str]) -> int:
+    removed = 0
+    for image_ref in image_refs:
+        try:
+            image_ref_to_path(image_ref).unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error removing screenshot {image_ref}: {str(e)}")
+    return removed
+
+session_cleanup = SessionCleanupService()
@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.config import (
+    SESSION_WRITE_FLUSH_INTERVAL, SESSION_WRITE_BATCH_SIZE, SESSION_WRITE_MAX_RETRIES,
+    POSTURE_SAMPLE_INTERVAL, logger
+)
+from app.models.database_models import SessionItemModel
+
+DUPLICATE_KEY_ERROR = 11000
+
+class WriteBehindBuffer:
+    """Write-behind buffer of MongoDB write operations.
+
+    Subclasses only queue operations with _queue() and return immediately;
+    the queue is flushed with a single ordered bulk_write every
+    `flush_interval` seconds or once `batch_size` operations are pending.
+    close() must be awaited when the owner is done to flush what is left.
+
+    A write error is deterministic: the failing operation is skipped (an
+    insert with a duplicate key was already written by an earlier attempt,
+    anything else is logged) and the rest of the batch is written. On a
+    network or server error the batch is kept and retried at the next flush,
+    and dropped after `max_retries` failed flushes so the queue cannot grow
+    without bound.
+    """
+    log_label = "write"  # Tên loại thao tác trong log
+
+    def __init__(self, collection,
+                 flush_interval: float = SESSION_WRITE_FLUSH_INTERVAL,
+                 batch_size: int = SESSION_WRITE_BATCH_SIZE,
+                 max_retries: int = SESSION_WRITE_MAX_RETRIES):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._failed_flushes = 0
+        self._operations: List = []
+        self._flush_lock = asyncio.Lock()
+        self._size_flush: Optional[asyncio.Task] = None
+        self._timer = asyncio.create_task(self._flush_periodically())
+
+    def _queue(self, operation) -> None:
+        self._operations.append(operation)
+        if len(self._operations) >= self.batch_size and (self._size_flush is None or self._size_flush.done()):
+            self._size_flush = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        """Write all queued operations with one bulk_write"""
+        async with self._flush_lock:
+            if not self._operations:
+                return
+            operations, self._operations = self._operations, []
+            while operations:
+                try:
+                    await self.collection.bulk_write(operations, ordered=True)
+                    operations = []
+                except BulkWriteError as e:
+                    write_errors = e.details.get("writeErrors") or []
+                    if not write_errors:
+                        # Chỉ có writeConcernErrors: mọi thao tác đã được ghi trên primary
+                        logger.warning(f"Write concern error writing {self.log_label} operations: {e.details.get('writeConcernErrors')}")
+                        operations = []
+                        break
+                    # Ordered: mọi thao tác trước thao tác lỗi đầu tiên đã được ghi
+                    write_error = write_errors[0]
+                    failed_index = write_error["index"]
+                    if write_error.get("code") != DUPLICATE_KEY_ERROR:
+                        # Lỗi cố định (validation, document quá lớn...): thử lại cũng không qua
+                        logger.error(f"Skipping {self.log_label} operation: {write_error.get('errmsg')}")
+                    # Trùng khóa: đã được ghi ở lần thử trước. Bỏ thao tác lỗi, ghi tiếp phần còn lại
+                    operations = operations[failed_index + 1:]
+                except Exception as e:
+                    # Không biết phần nào đã ghi: thử lại cả lô, insert đã ghi sẽ gặp lỗi trùng khóa ở trên
+                    logger.error(f"Error writing {len(operations)} {self.log_label} operations: {str(e)}")
+                    break
+            
+            if not operations:
+                self._failed_flushes = 0
+                return
+            self._failed_flushes += 1
+            if self._failed_flushes >= self.max_retries:
+                logger.error(f"Dropping {len(operations)} {self.log_label} operations after {self._failed_flushes} failed flushes")
+                self._failed_flushes = 0
+                return
+            # Giữ lại để thử lại ở lần flush sau, đúng thứ tự ban đầu
+            self._operations = operations + self._operations
+
+    async def _flush_periodically(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Error flushing {self.log_label} operations: {str(e)}")
+        except asyncio.CancelledError:
+            pass
+
+    async def close(self) -> None:
+        """Stop the timer and flush every pending operation"""
+        self._timer.cancel()
+        if self._size_flush is not None and not self._size_flush.done():
+            await asyncio.gather(self._size_flush, return_exceptions=True)
+        await self.flush()
+
+class SessionItemWriter(WriteBehindBuffer):
+    """Write-behind buffer for the session_items of one detection session.
+
+    open_item() and close_item() only queue operations; see WriteBehindBuffer
+    for batching and error handling.
+    """
+    log_label = "session item"
+
+    def open_item(self, session_item: SessionItemModel) -> ObjectId:
+        """Queue the insert of a new session item and return its _id"""
+        document = session_item.dict(by_alias=True)
+        self._queue(InsertOne(document))
+        return document["_id"]
+
+    def close_item(self, item_id: ObjectId, end_timestamp: datetime) -> None:
+        """Queue setting the end timestamp of a session item"""
+        self._queue(UpdateOne({"_id": item_id}, {"$set": {"end_timestamp": end_timestamp}}))
+
+class PostureSampleWriter(WriteBehindBuffer):
+    """Write-behind buffer for the per-interval posture samples of one session.
+
+    Samples go to the time-series collection; at most one sample is kept per
+    `sample_interval` seconds, the others are dropped before they are queued.
+    """
+    log_label = "posture sample"
+
+    def __init__(self, collection, session_id: ObjectId, user_id: ObjectId,
+                 sample_interval: float = POSTURE_SAMPLE_INTERVAL, **kwargs):
+        super().__init__(collection, **kwargs)
+        self.meta = {"session_id": session_id, "user_id": user_id}
+        self.sample_interval = sample_interval
+        self._last_sample_time: Optional[datetime] = None
+
+    def add_sample(self, timestamp: datetime, label_id: str, confidence: float) -> bool:
+        """Queue a sample unless one was taken less than `sample_interval` ago"""
+        if (self._last_sample_time is not None and
+                (timestamp - self._last_sample_time).total_seconds() < self.sample_interval):
+            return False
+        self._last_sample_time = timestamp
+        self._queue(InsertOne({
+            "timestamp": timestamp,
+            "meta": self.meta,
+            "label_id": label_id,
+            "confidence": confidence
+        }))
+        return True
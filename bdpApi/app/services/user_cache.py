@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import AUTH_CACHE_TTL, AUTH_CACHE_SIZE
+from app.database.change_stream import ChangeStreamWatcher
+from app.database.database import get_users_collection
+
+class TokenUserCache:
+    """Short-lived LRU cache of verified JWT -> user document.
+
+    A hit skips both the JWT signature check and the users lookup. Entries
+    expire after `ttl` seconds (never later than the token itself) and the
+    least recently used entry is evicted beyond `max_size`. invalidate_user()
+    drops every token of a user; when MongoDB runs as a replica set a change
+    stream on the users collection calls it on every update or delete, so a
+    deactivated account stops authenticating immediately.
+    """
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # Không có change stream thì dựa vào TTL ngắn và invalidate_user()
+        self._watcher = ChangeStreamWatcher(
+            get_users_collection, self._on_user_change,
+            "Users change stream unavailable, relying on cache TTL"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Any]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: Any, token_exp: Optional[float] = None) -> None:
+        """Cache `user` for `token`; `token_exp` is the JWT exp claim (Unix time)"""
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        self._entries[token] = (time.monotonic() + ttl, user)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: Any) -> None:
+        """Drop every cached token of one user"""
+        user_id = str(user_id)
+        for token in [token for token, (_, user) in self._entries.items() if str(user.id) == user_id]:
+            del self._entries[token]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def start_watching(self) -> None:
+        """Invalidate cached users on every change of the users collection (replica set only)"""
+        self._watcher.start()
+
+    async def stop_watching(self) -> None:
+        await self._watcher.stop()
+
+    def _on_user_change(self, change: Dict[str, Any]) -> None:
+        document_key = change.get("documentKey")
+        if document_key:
+            self.invalidate_user(document_key["_id"])
+        else:
+            # drop/rename/invalidate: không biết user nào, xóa toàn bộ
+            self.clear()
+
+token_user_cache = TokenUserCache()
@@ -4,11 +4,13 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import logging
 from datetime import datetime
 
 from app.api.router import router as api_router
-from app.config import BASE_DIR, SCREENSHOTS_DIR, logger
+from app.config import BASE_DIR, SCREENSHOTS_DIR, INDEX_VERIFY_ON_STARTUP, logger
+from app.database.indexes import IndexVerificationError
 
 # Khởi tạo FastAPI
 app = FastAPI(title="Posture Detection API",docs_url="/docs")
@@ -30,13 +32,55 @@ async def startup_db_client():
         await client.admin.command('ping')
         logger.info("MongoDB connection established successfully")
         
+        # Tạo/cập nhật index theo khai báo và kiểm tra các truy vấn nóng không bị COLLSCAN
+        from app.database.database import db
+        from app.database.indexes import ensure_indexes, verify_hot_queries
+        await ensure_indexes(db)
+        if INDEX_VERIFY_ON_STARTUP:
+            await verify_hot_queries(db)
+        
         # Khởi tạo dữ liệu mặc định nếu cần
         await initialize_default_data()
+        
+        # Nạp danh mục nhãn vào bộ nhớ và theo dõi thay đổi
+        from app.services.label_cache import label_cache
+        await label_cache.load()
+        label_cache.start_watching()
+        
+        # Xóa cache token -> người dùng khi tài khoản thay đổi
+        from app.services.user_cache import token_user_cache
+        token_user_cache.start_watching()
+    except IndexVerificationError as e:
+        # Không khởi động với truy vấn nóng quét toàn bộ collection
+        logger.critical(str(e))
+        raise
     except ImportError:
         logger.error("MongoDB related packages not installed. Run 'pip install motor pymongo bson'")
     except Exception as e:
         logger.error(f"MongoDB connection error: {str(e)}")
 
+@app.on_event("startup")
+async def startup_alert_dispatcher():
+    # Bắt đầu kiểm tra ESP32 định kỳ ngay khi khởi động
+    from app.services.alert_dispatcher import alert_dispatcher
+    await asyncio.to_thread(alert_dispatcher.start)
+    
+    # Giải mã trước âm thanh cảnh báo cục bộ (không chặn event loop)
+    from app.services.alert_service import alert_service
+    await asyncio.to_thread(alert_service.load_sounds)
+
+@app.on_event("shutdown")
+async def shutdown_alert_dispatcher():
+    from app.services.alert_dispatcher import alert_dispatcher
+    await asyncio.to_thread(alert_dispatcher.stop)
+
+@app.on_event("shutdown")
+async def shutdown_label_cache():
+    from app.services.label_cache import label_cache
+    from app.services.user_cache import token_user_cache
+    await label_cache.stop_watching()
+    await token_user_cache.stop_watching()
+
 # Khởi tạo dữ liệu mặc định
 async def initialize_default_data():
     try:
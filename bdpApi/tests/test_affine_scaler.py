@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+preprocessing = pytest.importorskip("sklearn.preprocessing")
+
+from app.core.scaler import AffineScaler
+
+def _data(n_features: int = 12):
+    rng = np.random.default_rng(0)
+    train = rng.normal(loc=3.0, scale=2.5, size=(200, n_features))
+    # Một đặc trưng hằng số: sklearn giữ scale_ = 1 cho cột này
+    train[:, 0] = 7.0
+    probe = rng.normal(loc=3.0, scale=4.0, size=(50, n_features))
+    return train, probe
+
+@pytest.mark.parametrize("with_mean, with_std", [(True, True), (True, False), (False, True), (False, False)])
+def test_standard_scaler_parity(with_mean, with_std):
+    train, probe = _data()
+    scaler = preprocessing.StandardScaler(with_mean=with_mean, with_std=with_std).fit(train)
+
+    np.testing.assert_allclose(
+        AffineScaler.from_sklearn(scaler).transform(probe), scaler.transform(probe), rtol=1e-5, atol=1e-5
+    )
+
+@pytest.mark.parametrize("feature_range", [(0, 1), (-1, 1)])
+def test_min_max_scaler_parity(feature_range):
+    train, probe = _data()
+    scaler = preprocessing.MinMaxScaler(feature_range=feature_range).fit(train)
+
+    np.testing.assert_allclose(
+        AffineScaler.from_sklearn(scaler).transform(probe), scaler.transform(probe), rtol=1e-5, atol=1e-5
+    )
+
+def test_min_max_scaler_with_clip_is_rejected():
+    train, _ = _data()
+    scaler = preprocessing.MinMaxScaler(clip=True).fit(train)
+
+    with pytest.raises(ValueError):
+        AffineScaler.from_sklearn(scaler)
+
+def test_unsupported_scaler_is_rejected():
+    train, _ = _data()
+    scaler = preprocessing.RobustScaler().fit(train)
+
+    with pytest.raises(TypeError):
+        AffineScaler.from_sklearn(scaler)